@@ -1,9 +1,15 @@
 # app/crud.py
 
+import logging
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
+from typing import Optional
 from . import models, schemas
+from .utils.user_events import users_commit, users_inserted, users_deleted
+
+logger = logging.getLogger(__name__)
 
 
 # ✅ Crear un usuario nuevo
@@ -11,13 +17,15 @@ def crear_usuario(db: Session, usuario: schemas.UsuarioCreate):
     nuevo_usuario = models.User(name=usuario.name, email=usuario.email)
     try:
         db.add(nuevo_usuario)
-        db.commit()
-        db.refresh(nuevo_usuario)
-        print(f"[✅ USUARIO CREADO] {nuevo_usuario.email}")
+        with users_commit():
+            db.commit()
+            db.refresh(nuevo_usuario)
+            users_inserted([(nuevo_usuario.id, nuevo_usuario.name, nuevo_usuario.email)])
+        logger.info("Usuario creado", extra={"user_id": nuevo_usuario.id, "email": nuevo_usuario.email})
         return nuevo_usuario
     except IntegrityError:
         db.rollback()
-        print(f"[⚠️ ERROR] Email duplicado: {usuario.email}")
+        logger.warning("Email duplicado", extra={"email": usuario.email})
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El correo ya está registrado en la base de datos."
@@ -29,6 +37,79 @@ def obtener_usuarios(db: Session):
     return db.query(models.User).all()
 
 
+# ✅ Obtener una página del listado como diccionarios (sin instanciar objetos ORM)
+def obtener_usuarios_listado(db: Session, skip: int = 0, limit: Optional[int] = None):
+    query = (
+        db.query(models.User.id, models.User.name, models.User.email)
+        .order_by(models.User.id)
+        .offset(skip)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return [{"id": row.id, "name": row.name, "email": row.email} for row in query]
+
+
+def _escapar_like(texto: str) -> str:
+    # Escapar comodines de LIKE para que el texto se busque literalmente
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# ✅ Buscar usuarios por prefijo de email o nombre (usa los índices de ambas columnas)
+def buscar_usuarios_prefijo(db: Session, texto: str, limit: int):
+    patron = _escapar_like(texto) + "%"
+    columnas = (models.User.id, models.User.name, models.User.email)
+
+    # Una consulta por columna: cada una recorre su propio índice en orden y corta en `limit`
+    por_email = (
+        db.query(*columnas)
+        .filter(models.User.email.like(patron, escape="\\"))
+        .order_by(models.User.email)
+        .limit(limit)
+        .all()
+    )
+    por_nombre = (
+        db.query(*columnas)
+        .filter(models.User.name.like(patron, escape="\\"))
+        .order_by(models.User.name)
+        .limit(limit)
+        .all()
+    )
+    return por_email, por_nombre
+
+
+# ✅ Buscar usuarios por subcadena (recorre la tabla; respaldo mientras no hay índice de n-gramas)
+def buscar_usuarios_subcadena(db: Session, texto: str, limit: int):
+    patron = "%" + _escapar_like(texto) + "%"
+    return (
+        db.query(models.User.id, models.User.name, models.User.email)
+        .filter(models.User.email.like(patron, escape="\\") | models.User.name.like(patron, escape="\\"))
+        .limit(limit)
+        .all()
+    )
+
+
+# ✅ Leer id, nombre y email de todos los usuarios por lotes (para índices en memoria)
+def iterar_usuarios(db: Session, batch_size: int = 10000):
+    query = db.query(models.User.id, models.User.name, models.User.email).yield_per(batch_size)
+    for row in query:
+        yield row.id, row.name, row.email
+
+
+# ✅ Leer usuarios en lotes con un cursor del lado del servidor (exportación)
+def iterar_usuarios_lotes(db: Session, batch_size: int = 5000):
+    """
+    stream_results usa un cursor sin buffer (SSCursor en pymysql): las filas se
+    traen de MySQL a medida que se consumen, así la memoria no crece con la tabla.
+    """
+    result = db.execute(
+        select(models.User.id, models.User.name, models.User.email)
+        .order_by(models.User.id)
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+    for lote in result.partitions():
+        yield [tuple(fila) for fila in lote]
+
+
 # ✅ Borrar un usuario por ID
 def borrar_usuario(db: Session, usuario_id: int):
     usuario = db.query(models.User).filter(models.User.id == usuario_id).first()
@@ -38,7 +119,10 @@ def borrar_usuario(db: Session, usuario_id: int):
             detail="Usuario no encontrado."
         )
 
+    eliminado = (usuario.id, usuario.name, usuario.email)
     db.delete(usuario)
-    db.commit()
-    print(f"[🗑️ USUARIO ELIMINADO] ID: {usuario_id}")
+    with users_commit():
+        db.commit()
+        users_deleted([eliminado])
+    logger.info("Usuario eliminado", extra={"user_id": usuario_id})
     return {"mensaje": "Usuario eliminado correctamente."}
@@ -11,11 +11,27 @@ la sesión local (SessionLocal) y la clase base para los modelos (Base).
 Incluye además una función generadora get_db() que provee sesiones
 de base de datos seguras para las rutas del backend, garantizando
 el cierre correcto de la conexión al finalizar.
+
+El motor se crea de forma perezosa (get_engine) en el primer uso, para que
+importar la aplicación no cargue el driver ni dependa de que MySQL esté listo.
+
+Opcionalmente se configuran réplicas de lectura (DB_REPLICA_HOSTS): las
+consultas de solo lectura usan get_read_db()/get_read_direct(), que eligen
+una réplica sana y vuelven al primario si el retraso supera el umbral o si
+la misma petición ya escribió (read-your-writes). El retraso lo consulta
+monitor_replicas() en segundo plano; las peticiones solo leen el valor cacheado.
 """
 
+import asyncio
+import logging
 import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
@@ -24,6 +40,8 @@ import time
 # Cargar variables de entorno desde el archivo .env (usado fuera de Docker)
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # ------------------------------------------------------------
 # 1. Parámetros de conexión
 # ------------------------------------------------------------
@@ -34,6 +52,7 @@ DB_PASSWORD = os.getenv("DB_PASSWORD", "daniel123")
 DB_HOST = os.getenv("DB_HOST", "db")
 DB_PORT = os.getenv("DB_PORT", "3306")
 DB_NAME = os.getenv("DB_NAME", "lara_bs")
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
 
 # ------------------------------------------------------------
 # 2. Construcción de la URL de conexión compatible con SQLAlchemy
@@ -44,22 +63,191 @@ SQLALCHEMY_DATABASE_URL = (
 )
 
 # ------------------------------------------------------------
-# 3. Creación del motor (Engine)
+# 2b. Latencia por pool
 # ------------------------------------------------------------
-# El parámetro `echo=True` permite ver las consultas SQL en consola (solo en desarrollo).
-# `future=True` habilita características más modernas de SQLAlchemy.
-try:
-    engine = create_engine(SQLALCHEMY_DATABASE_URL, echo=True, future=True)
-except SQLAlchemyError as e:
-    # Si ocurre un error al crear el motor, se muestra en consola.
-    print(f"Error al crear el motor de base de datos: {e}")
-    engine = None
+# Cada motor registra la duración de sus consultas para poder comparar
+# el primario con las réplicas (ver GET /api/db/pools).
+PRIMARY_POOL = "primary"
+
+
+class PoolStats:
+    """Cantidad, promedio, máximo y percentiles de las últimas consultas de un pool."""
+
+    def __init__(self, name: str, window: int = 1000):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self._samples.append(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total, maximum = self.count, self.total, self.max
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 2) if samples else None
+
+        return {
+            "queries": count,
+            "avg_ms": round(total / count * 1000, 2) if count else None,
+            "max_ms": round(maximum * 1000, 2) if count else None,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+        }
+
+
+pool_stats: Dict[str, PoolStats] = {}
+
+
+def _stats_for(name: str) -> PoolStats:
+    stats = pool_stats.get(name)
+    if stats is None:
+        stats = pool_stats.setdefault(name, PoolStats(name))
+    return stats
+
+
+@contextmanager
+def timed(pool_name: str):
+    """Mide un bloque de consultas hechas fuera de SQLAlchemy (conexiones directas)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stats_for(pool_name).record(time.perf_counter() - inicio)
+
+
+def _create_instrumented_engine(url: str, pool_name: str):
+    """
+    Crea un motor con la configuración común y registra la latencia de cada consulta.
+    No se usa `echo=True`: el SQL se registra a través del logger "sqlalchemy.engine",
+    cuyo nivel se controla con LOG_LEVELS (ver logging_config.py).
+    `future=True` habilita características más modernas de SQLAlchemy.
+    `pool_pre_ping=True` descarta conexiones muertas del pool (ej. tras reiniciar MySQL).
+    """
+    engine = create_engine(
+        url,
+        future=True,
+        pool_pre_ping=True,
+        connect_args={"connect_timeout": DB_CONNECT_TIMEOUT}
+    )
+    stats = _stats_for(pool_name)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("query_start")
+        if stack:
+            stats.record(time.perf_counter() - stack.pop())
+
+    return engine
+
 
 # ------------------------------------------------------------
-# 4. Configuración del SessionLocal
+# 3. Configuración del SessionLocal
 # ------------------------------------------------------------
 # Esta clase nos permitirá crear sesiones individuales de conexión con la base de datos.
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Se vincula al motor cuando este se crea en get_engine().
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+# ------------------------------------------------------------
+# 4. Creación perezosa del motor (Engine)
+# ------------------------------------------------------------
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    Crea el motor en el primer uso y lo reutiliza después.
+    Importar este módulo no carga el driver pymysql ni abre conexiones.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                try:
+                    _engine = _create_instrumented_engine(SQLALCHEMY_DATABASE_URL, PRIMARY_POOL)
+                except SQLAlchemyError as e:
+                    # Si ocurre un error al crear el motor, se registra en el log.
+                    logger.error("Error al crear el motor de base de datos: %s", e)
+                    raise
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def __getattr__(name):
+    # Compatibilidad: `database.engine` sigue disponible, pero se crea al accederlo
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(name)
+
+
+def check_connection():
+    """
+    Verifica que el pool pueda entregar una conexión válida (SELECT 1).
+    Retorna (ok, detalle_error).
+    """
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True, None
+    except Exception as e:
+        return False, str(e)
+
+# ------------------------------------------------------------
+# 4b. Índices agregados después de crear el esquema
+# ------------------------------------------------------------
+# init_db.sql solo se ejecuta sobre un volumen de MySQL nuevo: las bases ya
+# existentes reciben estos índices al arrancar la app (ensure_indexes).
+# (tabla, nombre del índice, columnas)
+REQUIRED_INDEXES = (
+    ("users", "ix_users_name", "name"),
+)
+
+
+def ensure_indexes() -> None:
+    """
+    Crea los índices de REQUIRED_INDEXES que falten (bloqueante; se llama en un hilo
+    al arrancar). El DDL en línea no bloquea las escrituras sobre la tabla. Si varios
+    workers lo intentan a la vez, el que llega segundo recibe "nombre duplicado" y sigue.
+    """
+    try:
+        _ensure_indexes()
+    except Exception as e:
+        logger.warning("No se pudieron verificar los índices: %s", e)
+
+
+def _ensure_indexes() -> None:
+    with get_engine().connect() as conn:
+        for table, index, columns in REQUIRED_INDEXES:
+            exists = conn.execute(
+                text(
+                    "SELECT 1 FROM information_schema.statistics "
+                    "WHERE table_schema = DATABASE() AND table_name = :table AND index_name = :index LIMIT 1"
+                ),
+                {"table": table, "index": index}
+            ).first()
+            if exists:
+                continue
+            logger.info("Creando índice faltante", extra={"table": table, "index": index})
+            try:
+                conn.execute(text(f"CREATE INDEX {index} ON {table} ({columns}) ALGORITHM=INPLACE LOCK=NONE"))
+                conn.commit()
+            except SQLAlchemyError as e:
+                logger.warning("No se pudo crear el índice %s: %s", index, e)
 
 # ------------------------------------------------------------
 # 5. Clase Base
@@ -81,11 +269,12 @@ def get_db():
     """
     db = None
     try:
+        get_engine()
         db = SessionLocal()
         yield db  # Se entrega la sesión al endpoint que la necesite
     except SQLAlchemyError as e:
         # Manejo de error en caso de que la sesión falle al inicializarse
-        print(f"Error en la sesión de base de datos: {e}")
+        logger.error("Error en la sesión de base de datos: %s", e)
         raise e
     finally:
         # Cierre seguro de la conexión al finalizar el uso de la sesión
@@ -98,8 +287,7 @@ def get_db():
 # El módulo excel_router necesita conexiones directas MySQL (sin ORM)
 # para operaciones de inserción masiva y manejo de transacciones.
 
-import mysql.connector
-from mysql.connector import Error as MySQLError
+# mysql.connector se importa dentro de connect() para no cargarlo al iniciar la app.
 
 class DirectMySQLConnection:
     """
@@ -107,37 +295,42 @@ class DirectMySQLConnection:
     Usada específicamente por el módulo de carga de Excel.
     """
     
-    def __init__(self):
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None, name: str = "primary"):
         # Reutiliza las mismas credenciales del archivo .env
-        self.host = DB_HOST
+        self.host = host or DB_HOST
         self.user = DB_USER
         self.password = DB_PASSWORD
         self.database = DB_NAME
-        self.port = int(DB_PORT)
+        self.port = int(port or DB_PORT)
+        self.name = name
         self.connection = None
 
     def connect(self):
         """Establece conexión directa con MySQL"""
+        import mysql.connector
+        from mysql.connector import Error as MySQLError
+
         try:
             self.connection = mysql.connector.connect(
                 host=self.host,
                 user=self.user,
                 password=self.password,
                 database=self.database,
-                port=self.port
+                port=self.port,
+                connection_timeout=DB_CONNECT_TIMEOUT
             )
             if self.connection.is_connected():
-                print(f"✅ Conexión directa MySQL establecida con {self.database}")
+                logger.debug("Conexión directa MySQL establecida", extra={"database": self.database})
                 return self.connection
         except MySQLError as e:
-            print(f"❌ Error al conectar a MySQL: {e}")
+            logger.error("Error al conectar a MySQL: %s", e)
             raise e
 
     def disconnect(self):
         """Cierra la conexión"""
         if self.connection and self.connection.is_connected():
             self.connection.close()
-            print("🔌 Conexión directa MySQL cerrada")
+            logger.debug("Conexión directa MySQL cerrada")
 
     def get_connection(self):
         """Obtiene una conexión activa"""
@@ -161,3 +354,206 @@ def get_db_connection():
         mysql.connector.connection.MySQLConnection: Conexión activa a MySQL
     """
     return _direct_mysql.get_connection()
+
+
+# ============================================================
+# 8. Réplicas de lectura y enrutamiento lectura/escritura
+# ============================================================
+# DB_REPLICA_HOSTS: lista "host[:puerto]" separada por comas (vacía = sin réplicas).
+# DB_REPLICA_MAX_LAG: segundos de retraso máximos para leer de una réplica.
+# DB_REPLICA_LAG_CHECK_SECONDS: cada cuánto monitor_replicas() vuelve a consultar el retraso.
+# Un retraso sin actualizar durante REPLICA_STALE_CHECKS intervalos deja la réplica fuera.
+DB_REPLICA_HOSTS = [h.strip() for h in os.getenv("DB_REPLICA_HOSTS", "").split(",") if h.strip()]
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+DB_REPLICA_LAG_CHECK_SECONDS = float(os.getenv("DB_REPLICA_LAG_CHECK_SECONDS", "2"))
+REPLICA_STALE_CHECKS = 3
+
+# Estado por petición: {"wrote": bool}. Lo inicializa DBRoutingMiddleware; como el
+# diccionario es mutable, los hilos del threadpool que copian el contexto lo comparten.
+_request_state: ContextVar[Optional[dict]] = ContextVar("db_request_state", default=None)
+
+
+def mark_write():
+    """Indica que la petición actual escribió en el primario: sus lecturas siguientes van al primario."""
+    state = _request_state.get()
+    if state is not None:
+        state["wrote"] = True
+
+
+def request_wrote() -> bool:
+    state = _request_state.get()
+    return bool(state and state["wrote"])
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_write_on_flush(session, flush_context):
+    mark_write()
+
+
+class DBRoutingMiddleware:
+    """Middleware ASGI que abre un estado de escritura nuevo para cada petición."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_state.set({"wrote": False})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_state.reset(token)
+
+
+class ReplicaPool:
+    """Motor y conexión directa de una réplica, con el retraso de replicación cacheado."""
+
+    def __init__(self, address: str):
+        host, _, port = address.partition(":")
+        self.host = host
+        self.port = int(port or 3306)
+        self.name = f"replica:{self.host}:{self.port}"
+        self.url = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{self.host}:{self.port}/{DB_NAME}"
+        self.direct = DirectMySQLConnection(self.host, self.port, name=self.name)
+        self.lag: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._engine = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = _create_instrumented_engine(self.url, self.name)
+        return self._engine
+
+    def _read_lag(self) -> Tuple[Optional[float], Optional[str]]:
+        """
+        (retraso, error). El retraso es Seconds_Behind_Source de SHOW REPLICA STATUS
+        (MySQL >= 8.0.22), o Seconds_Behind_Master en versiones anteriores; None si
+        la réplica no replica. Bloqueante: solo se llama desde monitor_replicas().
+        """
+        with self.engine.connect() as conn:
+            for query, column in (("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+                                  ("SHOW SLAVE STATUS", "Seconds_Behind_Master")):
+                try:
+                    row = conn.execute(text(query)).mappings().first()
+                except SQLAlchemyError:
+                    continue
+                if row is None:
+                    return None, "la réplica no tiene replicación configurada"
+                value = row.get(column)
+                return (float(value) if value is not None else None), None
+        return None, "sin permiso para consultar el estado de replicación"
+
+    def refresh_lag(self) -> None:
+        """Consulta el retraso y lo publica junto con el error y la hora de la consulta."""
+        try:
+            lag, error = self._read_lag()
+        except Exception as e:
+            lag, error = None, str(e)
+            logger.warning("No se pudo consultar el retraso de %s: %s", self.name, e)
+        with self._lock:
+            self.lag = lag
+            self.last_error = error
+            self._checked_at = time.monotonic()
+
+    def current_lag(self) -> Optional[float]:
+        """Último retraso medido, o None si no hay medición reciente. No consulta la réplica."""
+        with self._lock:
+            lag, checked_at = self.lag, self._checked_at
+        if time.monotonic() - checked_at > DB_REPLICA_LAG_CHECK_SECONDS * REPLICA_STALE_CHECKS:
+            return None
+        return lag
+
+    def healthy(self) -> bool:
+        lag = self.current_lag()
+        return lag is not None and lag <= DB_REPLICA_MAX_LAG
+
+
+replica_pools: List[ReplicaPool] = [ReplicaPool(address) for address in DB_REPLICA_HOSTS]
+_replica_cursor = 0
+
+
+def _pick_replica() -> Optional[ReplicaPool]:
+    """Réplica sana en round-robin, o None si la petición escribió o ninguna está al día."""
+    global _replica_cursor
+    if not replica_pools or request_wrote():
+        return None
+    for _ in range(len(replica_pools)):
+        replica = replica_pools[_replica_cursor % len(replica_pools)]
+        _replica_cursor += 1
+        if replica.healthy():
+            return replica
+    return None
+
+
+@contextmanager
+def read_session():
+    """
+    Sesión de solo lectura: apunta a una réplica cuando hay una disponible y
+    vuelve al primario en caso contrario. Útil fuera de las dependencias de
+    FastAPI, por ejemplo en generadores de StreamingResponse que siguen
+    leyendo después de que el endpoint retornó.
+    """
+    primary = get_engine()
+    replica = _pick_replica()
+    db = SessionLocal(bind=replica.engine if replica else primary)
+    # Los endpoints pueden consultar de dónde vino el dato (ej. para no cachear lecturas atrasadas)
+    db.info["pool"] = replica.name if replica else PRIMARY_POOL
+    db.info["replica_lag"] = replica.current_lag() if replica else None
+    try:
+        yield db
+    except SQLAlchemyError as e:
+        logger.error("Error en la sesión de lectura: %s", e)
+        raise e
+    finally:
+        db.close()
+
+
+def get_read_db():
+    """Como get_db(), pero para endpoints de solo lectura (ver read_session())."""
+    with read_session() as db:
+        yield db
+
+
+async def monitor_replicas() -> None:
+    """
+    Tarea de fondo: consulta el retraso de todas las réplicas cada
+    DB_REPLICA_LAG_CHECK_SECONDS en hilos aparte, para que ninguna petición
+    espere a SHOW REPLICA STATUS ni al timeout de conexión de una réplica caída.
+    """
+    if not replica_pools:
+        return
+    while True:
+        started = time.monotonic()
+        await asyncio.gather(*(asyncio.to_thread(replica.refresh_lag) for replica in replica_pools))
+        await asyncio.sleep(max(0.0, DB_REPLICA_LAG_CHECK_SECONDS - (time.monotonic() - started)))
+
+
+def get_read_direct() -> DirectMySQLConnection:
+    """Conexión directa (mysql.connector) para lecturas, con el mismo criterio que get_read_db()."""
+    replica = _pick_replica()
+    return replica.direct if replica else _direct_mysql
+
+
+def pools_status() -> dict:
+    """Latencias por pool y estado de cada réplica (GET /api/db/pools)."""
+    return {
+        "primary": _stats_for(PRIMARY_POOL).snapshot(),
+        "max_lag_seconds": DB_REPLICA_MAX_LAG,
+        "replicas": [
+            {
+                "name": replica.name,
+                "lag_seconds": replica.current_lag(),
+                "healthy": replica.healthy(),
+                "error": replica.last_error,
+                "latency": _stats_for(replica.name).snapshot(),
+            }
+            for replica in replica_pools
+        ],
+    }
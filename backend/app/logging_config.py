@@ -0,0 +1,183 @@
+"""
+Archivo: logging_config.py
+Ubicación: backend/app/logging_config.py
+
+Descripción:
+-------------
+Configuración centralizada de logging estructurado para el backend.
+
+Los módulos solo encolan registros (QueueHandler); un hilo aparte
+(QueueListener) se encarga de formatear y escribir en consola y en el
+archivo rotativo /app/logs/app.log, que es el que lee routers/system.py.
+Así el hilo de la petición nunca espera por E/S de disco ni por stdout.
+
+Variables de entorno:
+    LOG_LEVEL       Nivel raíz (por defecto INFO).
+    LOG_LEVELS      Niveles por subsistema, ej: "app.crud=DEBUG,sqlalchemy.engine=INFO".
+    LOG_FORMAT      "json" (por defecto) o "text".
+    LOG_PATH        Ruta del archivo de log (por defecto /app/logs/app.log).
+    LOG_MAX_BYTES   Tamaño máximo antes de rotar (por defecto 10 MB).
+    LOG_BACKUPS     Cantidad de archivos rotados a conservar (por defecto 5).
+    LOG_QUEUE_SIZE  Capacidad de la cola; si se llena se descartan registros (por defecto 10000).
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+LOG_PATH = os.getenv("LOG_PATH", "/app/logs/app.log")
+
+# Niveles por defecto de subsistemas ruidosos. El SQL de SQLAlchemy solo se
+# registra si se pide explícitamente (reemplaza a echo=True).
+DEFAULT_LEVELS = {
+    "sqlalchemy.engine": "WARNING",
+    "uvicorn.access": "WARNING",
+}
+
+# Atributos estándar de LogRecord; todo lo demás viene de `extra=` y se incluye en el JSON
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+# ============================================================
+# Formateadores
+# ============================================================
+class JSONFormatter(logging.Formatter):
+    """Formatea cada registro como una línea JSON con los campos de `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+TEXT_FORMAT = "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+
+
+# ============================================================
+# Handler de cola no bloqueante
+# ============================================================
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que deja el formateo al hilo del listener y nunca bloquea:
+    si la cola está llena el registro se descarta y se cuenta en `dropped`.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Solo se resuelve el mensaje (los args pueden mutar después);
+        # el formateo completo ocurre en el hilo del listener.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    """Convierte "a=DEBUG,b=INFO" en {"a": "DEBUG", "b": "INFO"}."""
+    levels = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _build_file_handler(formatter: logging.Formatter) -> Optional[logging.Handler]:
+    """Crea el handler rotativo; si la carpeta no es escribible (desarrollo local) retorna None."""
+    try:
+        os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            LOG_PATH,
+            maxBytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+            backupCount=int(os.getenv("LOG_BACKUPS", "5")),
+            encoding="utf-8",
+        )
+    except OSError:
+        return None
+    handler.setFormatter(formatter)
+    return handler
+
+
+# ============================================================
+# Inicialización y cierre
+# ============================================================
+def setup_logging() -> None:
+    """
+    Configura el logging de toda la aplicación.
+    Es idempotente: llamadas repetidas (ej. con --reload) no duplican handlers.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        formatter: logging.Formatter = logging.Formatter(TEXT_FORMAT)
+    else:
+        formatter = JSONFormatter()
+
+    console = logging.StreamHandler()
+    console.setFormatter(formatter)
+    handlers = [console]
+
+    file_handler = _build_file_handler(formatter)
+    if file_handler is not None:
+        handlers.append(file_handler)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+    queue_handler = NonBlockingQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    levels = dict(DEFAULT_LEVELS)
+    levels.update(_parse_levels(os.getenv("LOG_LEVELS", "")))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    # Los loggers de uvicorn traen sus propios handlers; se redirigen a la cola
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uv_logger = logging.getLogger(name)
+        uv_logger.handlers = []
+        uv_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    if file_handler is None:
+        logging.getLogger(__name__).warning("No se pudo abrir %s; solo se registrará en consola", LOG_PATH)
+
+
+def shutdown_logging() -> None:
+    """Detiene el listener vaciando la cola pendiente."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
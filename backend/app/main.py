@@ -1,10 +1,25 @@
 # backend/app/main.py
 
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+from app.logging_config import setup_logging, shutdown_logging
+
+# Configurar logging antes de importar routers para que sus loggers usen la cola
+setup_logging()
 
 # Importación de routers existentes
-from app.routers import usuarios, excel_router
+# (no cargan pandas/openpyxl/mysql.connector hasta el primer uso)
+from app.routers import usuarios, excel_router, system
+from app.database import DBRoutingMiddleware, check_connection, ensure_indexes, monitor_replicas
+from app.warmup import start_warmup, warmup_state
+from app.utils.shared_state import progress_bus
+from app.utils.domain_stats import domain_stats
+from app.utils.ngram_index import users_ngram_index
+from app.utils.admission import UploadAdmissionMiddleware
+from app.utils.background import cancel_all, spawn
 
 # ------------------------------------------------------------
 # Cola global de progreso usada por el router del Excel
@@ -27,6 +42,18 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# ------------------------------------------------------------
+# Control de admisión de cargas (tamaño, concurrencia, memoria)
+# ------------------------------------------------------------
+# Se registra antes que CORS para que CORS quede por fuera y
+# las respuestas 413/429 también lleven sus cabeceras.
+app.add_middleware(UploadAdmissionMiddleware)
+
+# ------------------------------------------------------------
+# Enrutamiento lectura/escritura: estado "ya escribió" por petición
+# ------------------------------------------------------------
+app.add_middleware(DBRoutingMiddleware)
+
 # ------------------------------------------------------------
 # CORS - permitir comunicación con Angular
 # ------------------------------------------------------------
@@ -50,6 +77,75 @@ app.add_middleware(
 def health_check():
     return {"status": "ok"}
 
+# ------------------------------------------------------------
+# Readiness — el contenedor solo recibe tráfico si el pool conecta a MySQL
+# ------------------------------------------------------------
+@app.get("/ready")
+def readiness_check():
+    ok, error = check_connection()
+    body = {
+        "status": "ready" if ok else "unavailable",
+        "database": "ok" if ok else error,
+        "warmup": warmup_state["status"]
+    }
+    return JSONResponse(body, status_code=200 if ok else 503)
+
+# ------------------------------------------------------------
+# Calentamiento opcional en segundo plano (APP_WARMUP=1)
+# ------------------------------------------------------------
+@app.on_event("startup")
+async def warmup_on_startup():
+    start_warmup()
+
+# ------------------------------------------------------------
+# Suscripción al bus de progreso compartido entre workers
+# ------------------------------------------------------------
+@app.on_event("startup")
+async def subscribe_progress():
+    spawn(progress_bus.run(), "progress_bus")
+
+# ------------------------------------------------------------
+# Reconciliación periódica de los conteos por dominio
+# ------------------------------------------------------------
+@app.on_event("startup")
+async def reconcile_domain_stats():
+    spawn(domain_stats.run(), "domain_stats")
+
+# ------------------------------------------------------------
+# Índices faltantes en bases creadas antes de agregarlos (ej. ix_users_name)
+# ------------------------------------------------------------
+@app.on_event("startup")
+async def create_missing_indexes():
+    spawn(asyncio.to_thread(ensure_indexes), "ensure_indexes")
+
+# ------------------------------------------------------------
+# Índice de n-gramas de usuarios (USERS_NGRAM_INDEX=1), construido en segundo plano
+# ------------------------------------------------------------
+@app.on_event("startup")
+async def build_ngram_index():
+    spawn(users_ngram_index.run(), "ngram_index")
+
+# ------------------------------------------------------------
+# Retraso de las réplicas de lectura (DB_REPLICA_HOSTS), medido fuera de las peticiones
+# ------------------------------------------------------------
+@app.on_event("startup")
+async def watch_replica_lag():
+    spawn(monitor_replicas(), "monitor_replicas")
+
+# ------------------------------------------------------------
+# Cierre ordenado — cancela las tareas en segundo plano
+# ------------------------------------------------------------
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await cancel_all()
+
+# ------------------------------------------------------------
+# Cierre ordenado — vacía la cola de logs pendiente
+# ------------------------------------------------------------
+@app.on_event("shutdown")
+def flush_logs():
+    shutdown_logging()
+
 # ------------------------------------------------------------
 # Registrar routers
 # ------------------------------------------------------------
@@ -57,4 +153,7 @@ def health_check():
 app.include_router(usuarios.router)
 
 # Router del cargador avanzado de Excel
-app.include_router(excel_router.router)
\ No newline at end of file
+app.include_router(excel_router.router)
+
+# Router de sistema (logs, endpoints)
+app.include_router(system.router)
@@ -1,15 +1,26 @@
 # backend/app/routers/excel_router.py
 
-from fastapi import APIRouter, UploadFile, File, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import APIRouter, UploadFile, File, WebSocket, WebSocketDisconnect, HTTPException, Request, Query
 from fastapi.responses import StreamingResponse
-import pandas as pd
+from fastapi.concurrency import run_in_threadpool
 import io
-from typing import List, Dict, Any
+import logging
+import uuid
+from typing import Any, Callable, Dict, List, Optional
 from datetime import datetime
-from mysql.connector import Error
+
+# pandas y mysql.connector se importan dentro de cada función (carga perezosa):
+# así el arranque de la app no paga su costo de importación.
 
 # Importar configuración de base de datos
-from app.database import get_db_connection
+from app.database import PRIMARY_POOL, get_db_connection, get_read_direct, mark_write, timed
+from app.utils.user_events import users_commit, users_inserted
+from app.utils.serialization import frame_to_json, json_payload, json_response
+from app.utils.compact_frame import email_domains, memory_report, refresh_upload, top_domains
+from app.utils import upload_sessions
+from app.utils.shared_state import UploadConflict, upload_store, progress_bus
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/api/excel",
@@ -19,8 +30,104 @@ router = APIRouter(
 # Cola global para el progreso (se asigna desde main.py)
 progress_queue = []
 
-# Almacenamiento temporal de datos cargados
-uploaded_data_cache = {}
+# Almacenamiento temporal de datos cargados, compartido entre workers
+# (ver utils/shared_state.py). Tras modificar una entrada hay que volver a
+# asignarla: uploaded_data_cache[upload_id] = cache
+uploaded_data_cache = upload_store
+
+# Forma del payload de filas: "records" (lista de objetos) o "columns" (objeto de listas)
+SHAPE_PATTERN = "^(records|columns)$"
+
+# Reintentos de una modificación cuando otro worker guardó el mismo upload entretanto
+SAVE_ATTEMPTS = 3
+
+CONFLICT_DETAIL = "El upload fue modificado por otra petición; vuelve a intentarlo"
+
+
+def _read_upload(upload_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Entrada completa del upload; las sesiones se arman con sus partes (ver upload_sessions).
+    Bloqueante (SQLite y pickle): desde los endpoints se llama con run_in_threadpool.
+    """
+    if not upload_sessions.is_session_id(upload_id):
+        return uploaded_data_cache.get(upload_id)
+    try:
+        view = upload_sessions.load(uploaded_data_cache, upload_id)
+    except UploadConflict:
+        raise HTTPException(status_code=409, detail=CONFLICT_DETAIL)
+    return view.entry() if view is not None else None
+
+
+def _private_copy(cache: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copia de la entrada para modificarla: la leída es la copia memoizada que comparten
+    todas las peticiones del proceso. Conserva VERSION_KEY, así el compare-and-set
+    detecta a otra petición del mismo worker que guardó entretanto.
+    """
+    copy = {key: value for key, value in cache.items() if key != "query_index"}
+    copy["original_df"] = cache["original_df"].copy()
+    return copy
+
+
+def _modify_upload(upload_id: str, change: Callable[[Dict[str, Any]], Any]) -> Any:
+    """
+    Lee el upload, aplica `change` sobre una copia propia y la guarda con compare-and-set.
+    Si otra petición (de este u otro worker) lo guardó entretanto se relee y se vuelve
+    a aplicar el cambio; tras SAVE_ATTEMPTS conflictos responde 409. Retorna lo que
+    retorne `change`. Una sesión se guarda completa: sus partes quedan incorporadas.
+    """
+    for _ in range(SAVE_ATTEMPTS):
+        cache = _read_upload(upload_id)
+        if cache is None:
+            raise HTTPException(status_code=404, detail="Datos no encontrados")
+        cache = _private_copy(cache)
+        try:
+            result = change(cache)
+            uploaded_data_cache[upload_id] = cache
+            return result
+        except UploadConflict:
+            logger.info("Conflicto al guardar upload; se reintenta", extra={"upload_id": upload_id})
+        finally:
+            if upload_sessions.is_session_id(upload_id):
+                # La vista local quedó reemplazada por la entrada guardada (o desactualizada)
+                upload_sessions.forget(upload_id)
+    raise HTTPException(status_code=409, detail=CONFLICT_DETAIL)
+
+
+def _validate_and_clean(df):
+    """Valida columnas requeridas y normaliza name/email; descarta filas vacías."""
+    # CORRECCIÓN: Validación de columnas requeridas (name y email)
+    required_columns = ['name', 'email']
+    if not all(col in df.columns for col in required_columns):
+        raise HTTPException(
+            status_code=400, 
+            detail=f"El Excel debe contener las columnas: {', '.join(required_columns)}"
+        )
+    
+    # Validar que no esté vacío
+    if df.empty:
+        raise HTTPException(status_code=400, detail="El archivo Excel está vacío")
+    
+    # Limpiar datos
+    df['name'] = df['name'].astype(str).str.strip()
+    df['email'] = df['email'].astype(str).str.strip().str.lower()
+    
+    # Eliminar filas con datos vacíos
+    df = df.dropna(subset=['name', 'email'])
+    return df[(df['name'] != '') & (df['email'] != '')]
+
+
+def _describe_clusters(df, clusters: List[List[int]]) -> List[Dict[str, Any]]:
+    """
+    Convierte grupos de posiciones en objetos con id, filas, nombres y emails.
+    El id es el que se pasa en remove-duplicates?mode=near&clusters=...
+    """
+    names = df['name'].astype(str).to_numpy()
+    emails = df['email'].astype(str).to_numpy()
+    return [
+        {"id": cluster_id, "rows": rows, "names": names[rows].tolist(), "emails": emails[rows].tolist()}
+        for cluster_id, rows in enumerate(clusters)
+    ]
 
 # ============================================================
 # Gestión de conexiones WebSocket
@@ -37,13 +144,18 @@ class ConnectionManager:
         self.active_connections.remove(websocket)
 
     async def send_progress(self, message: dict):
-        for connection in self.active_connections:
+        # Se publica en el bus compartido; cada worker lo reenvía a sus conexiones
+        await progress_bus.publish(message)
+
+    async def broadcast_local(self, message: dict):
+        for connection in list(self.active_connections):
             try:
                 await connection.send_json(message)
             except:
                 pass
 
 manager = ConnectionManager()
+progress_bus.set_deliver(manager.broadcast_local)
 
 
 # ============================================================
@@ -66,16 +178,21 @@ def check_duplicates_in_db(emails: List[str]) -> Dict[str, Any]:
     """
     Verifica qué emails ya existen en la base de datos
     """
+    from mysql.connector import Error
+    
     try:
-        conn = get_db_connection()
+        # Solo lectura: puede resolverse en una réplica al día
+        direct = get_read_direct()
+        conn = direct.get_connection()
         cursor = conn.cursor(dictionary=True)
         
         # Crear consulta con placeholders
         placeholders = ', '.join(['%s'] * len(emails))
         query = f"SELECT email FROM users WHERE email IN ({placeholders})"
         
-        cursor.execute(query, emails)
-        existing = cursor.fetchall()
+        with timed(direct.name):
+            cursor.execute(query, emails)
+            existing = cursor.fetchall()
         
         existing_emails = [row['email'] for row in existing]
         cursor.close()
@@ -86,7 +203,7 @@ def check_duplicates_in_db(emails: List[str]) -> Dict[str, Any]:
         }
         
     except Error as e:
-        print(f"Error al verificar duplicados: {e}")
+        logger.error("Error al verificar duplicados: %s", e)
         return {"existing_count": 0, "existing_emails": []}
 
 
@@ -98,27 +215,35 @@ def insert_users_to_db(users_data: List[Dict[str, str]]) -> Dict[str, Any]:
     Inserta usuarios en la base de datos
     Retorna cantidad insertada y errores
     """
+    from mysql.connector import Error
+    
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
         inserted = 0
         errors = []
+        inserted_rows = []
         
         for user in users_data:
             try:
                 # CORRECCIÓN: Usar 'name' en lugar de 'main'
                 query = "INSERT INTO users (name, email) VALUES (%s, %s)"
-                cursor.execute(query, (user['name'], user['email']))
+                with timed(PRIMARY_POOL):
+                    cursor.execute(query, (user['name'], user['email']))
                 inserted += 1
+                inserted_rows.append((cursor.lastrowid, user['name'], user['email']))
             except Error as e:
                 errors.append({
                     "email": user['email'],
                     "error": str(e)
                 })
         
-        conn.commit()
-        cursor.close()
+        with users_commit():
+            conn.commit()
+            cursor.close()
+            mark_write()
+            users_inserted(inserted_rows)
         
         return {
             "inserted": inserted,
@@ -126,7 +251,7 @@ def insert_users_to_db(users_data: List[Dict[str, str]]) -> Dict[str, Any]:
         }
         
     except Error as e:
-        print(f"Error al insertar usuarios: {e}")
+        logger.error("Error al insertar usuarios: %s", e)
         raise HTTPException(status_code=500, detail=f"Error en BD: {str(e)}")
 
 
@@ -134,10 +259,19 @@ def insert_users_to_db(users_data: List[Dict[str, str]]) -> Dict[str, Any]:
 # Endpoint: Subir y validar Excel
 # ============================================================
 @router.post("/upload")
-async def upload_excel(file: UploadFile = File(...)):
+async def upload_excel(
+    request: Request,
+    file: UploadFile = File(...),
+    shape: str = Query("records", pattern=SHAPE_PATTERN),
+    near_duplicates: bool = False
+):
     """
     Sube archivo Excel, valida estructura, detecta duplicados en archivo y BD
+    shape: forma de las filas en la respuesta ("records" o "columns")
+    near_duplicates: si es True también agrupa casi-duplicados (variantes de email y nombre)
     """
+    import pandas as pd
+    
     try:
         # Validar extensión
         if not file.filename.endswith(('.xlsx', '.xls')):
@@ -151,25 +285,7 @@ async def upload_excel(file: UploadFile = File(...)):
         
         await manager.send_progress({"stage": "validating", "progress": 30, "message": "Validando estructura..."})
         
-        # CORRECCIÓN: Validación de columnas requeridas (name y email)
-        required_columns = ['name', 'email']
-        if not all(col in df.columns for col in required_columns):
-            raise HTTPException(
-                status_code=400, 
-                detail=f"El Excel debe contener las columnas: {', '.join(required_columns)}"
-            )
-        
-        # Validar que no esté vacío
-        if df.empty:
-            raise HTTPException(status_code=400, detail="El archivo Excel está vacío")
-        
-        # Limpiar datos
-        df['name'] = df['name'].astype(str).str.strip()
-        df['email'] = df['email'].astype(str).str.strip().str.lower()
-        
-        # Eliminar filas con datos vacíos
-        df = df.dropna(subset=['name', 'email'])
-        df = df[(df['name'] != '') & (df['email'] != '')]
+        df = _validate_and_clean(df)
         
         await manager.send_progress({"stage": "checking", "progress": 50, "message": "Detectando duplicados..."})
         
@@ -179,43 +295,161 @@ async def upload_excel(file: UploadFile = File(...)):
         
         # Verificar duplicados en base de datos
         emails_to_check = df['email'].tolist()
-        db_check = check_duplicates_in_db(emails_to_check)
+        db_check = await run_in_threadpool(check_duplicates_in_db, emails_to_check)
         
-        await manager.send_progress({"stage": "processing", "progress": 70, "message": "Procesando datos..."})
+        # Casi-duplicados (opcional): canonicalización + bloqueo, costo ~lineal
+        near_clusters = None
+        if near_duplicates:
+            from app.utils.near_duplicates import find_near_duplicate_clusters
+            near_clusters = await run_in_threadpool(find_near_duplicate_clusters, df)
         
-        # Convertir a diccionarios
-        data_dict = df.to_dict(orient='records')
+        await manager.send_progress({"stage": "processing", "progress": 70, "message": "Procesando datos..."})
         
         # Generar ID único
-        upload_id = f"upload_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        # El sufijo aleatorio evita colisiones entre workers en el mismo segundo
+        upload_id = f"upload_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
         
-        # Guardar en caché
-        uploaded_data_cache[upload_id] = {
-            "data": data_dict,
+        # Guardar en caché: solo el DataFrame compacto (sin copias en listas de diccionarios)
+        cache = {
             "columns": df.columns.tolist(),
-            "file_duplicates": file_duplicates.to_dict(orient='records'),
             "db_duplicates": db_check['existing_emails'],
+            "near_duplicate_clusters": near_clusters or [],
             "original_df": df
         }
+        refresh_upload(cache)
+        # Serializar y escribir en el almacenamiento compartido no debe bloquear el event loop
+        await run_in_threadpool(uploaded_data_cache.put, upload_id, cache)
+        logger.info("Upload cacheado", extra={"upload_id": upload_id, "rows": len(df), "memory_bytes": cache["memory_bytes"]})
         
         await manager.send_progress({"stage": "complete", "progress": 100, "message": "¡Carga completada!"})
         
-        return {
-            "upload_id": upload_id,
-            "total_rows": len(df),
-            "total_columns": len(df.columns),
-            "columns": df.columns.tolist(),
-            "file_duplicate_count": file_duplicate_count,
-            "db_duplicate_count": db_check['existing_count'],
-            "file_duplicates": file_duplicates.to_dict(orient='records') if file_duplicate_count > 0 else [],
-            "db_duplicates": db_check['existing_emails'],
-            "preview": data_dict[:10],
-            "statistics": {
+        near_fields = {}
+        if near_clusters is not None:
+            near_fields = {
+                "near_duplicate_cluster_count": len(near_clusters),
+                "near_duplicate_clusters": _describe_clusters(df, near_clusters)
+            }
+        
+        body = json_payload(
+            upload_id=upload_id,
+            total_rows=len(df),
+            total_columns=len(df.columns),
+            columns=df.columns.tolist(),
+            file_duplicate_count=file_duplicate_count,
+            db_duplicate_count=db_check['existing_count'],
+            file_duplicates=frame_to_json(file_duplicates, shape),
+            db_duplicates=db_check['existing_emails'],
+            preview=frame_to_json(df.head(10), shape),
+            statistics={
                 "total_valid": len(df),
                 "can_insert": len(df) - len(db_check['existing_emails'])
-            }
-        }
+            },
+            **near_fields
+        )
+        return await json_response(request, body)
+        
+    except Exception as e:
+        await manager.send_progress({"stage": "error", "progress": 0, "message": f"Error: {str(e)}"})
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================================
+# Sesiones de carga multi-archivo
+# ============================================================
+# Cada archivo se guarda como una parte nueva de la sesión, con compare-and-set
+# sobre su versión: si otro archivo se agregó entretanto se recalcula y reintenta.
+def _get_session(session_id: str):
+    view = None
+    if upload_sessions.is_session_id(session_id):
+        try:
+            view = upload_sessions.load(uploaded_data_cache, session_id)
+        except UploadConflict:
+            raise HTTPException(status_code=409, detail=CONFLICT_DETAIL)
+    if view is None:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada")
+    return view
+
+
+@router.post("/sessions")
+async def create_upload_session():
+    """
+    Crea una sesión vacía. Su session_id sirve como upload_id en data, statistics,
+    remove-duplicates, update-cell, export y save-to-db (guarda toda la sesión).
+    """
+    session_id = f"{upload_sessions.SESSION_PREFIX}{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    await run_in_threadpool(uploaded_data_cache.put, session_id, upload_sessions.new_session_entry())
+    view = await run_in_threadpool(_get_session, session_id)
+    return upload_sessions.session_summary(session_id, view)
+
+
+@router.get("/sessions/{session_id}")
+async def get_upload_session(session_id: str):
+    """Archivos recibidos y totales acumulados de la sesión."""
+    view = await run_in_threadpool(_get_session, session_id)
+    return upload_sessions.session_summary(session_id, view)
+
+
+@router.post("/sessions/{session_id}/files")
+async def add_session_file(
+    session_id: str,
+    request: Request,
+    file: UploadFile = File(...),
+    shape: str = Query("records", pattern=SHAPE_PATTERN)
+):
+    """
+    Agrega un archivo a la sesión. Solo se analizan sus filas: duplicados dentro
+    del archivo y contra los anteriores (índice de emails de la sesión) y, para
+    los emails que la sesión aún no tenía, duplicados en BD.
+    """
+    import pandas as pd
+    
+    if not file.filename.endswith(('.xlsx', '.xls')):
+        raise HTTPException(status_code=400, detail="Solo archivos Excel (.xlsx, .xls)")
+    await run_in_threadpool(_get_session, session_id)
+    
+    try:
+        await manager.send_progress({"stage": "reading", "progress": 10, "message": f"Leyendo {file.filename}..."})
+        contents = await file.read()
+        part = await run_in_threadpool(pd.read_excel, io.BytesIO(contents))
+        part = _validate_and_clean(part)
         
+        await manager.send_progress({"stage": "checking", "progress": 50, "message": "Detectando duplicados..."})
+        
+        for _ in range(SAVE_ATTEMPTS):
+            view = await run_in_threadpool(_get_session, session_id)
+            version, nuevos = view.unseen_emails(part)
+            if nuevos:
+                db_check = await run_in_threadpool(check_duplicates_in_db, nuevos)
+            else:
+                db_check = {"existing_count": 0, "existing_emails": []}
+            
+            await manager.send_progress({"stage": "processing", "progress": 70, "message": "Agregando a la sesión..."})
+            
+            try:
+                added = await run_in_threadpool(
+                    upload_sessions.add_file, uploaded_data_cache, session_id, view, version,
+                    part, file.filename, db_check['existing_emails']
+                )
+                break
+            except UploadConflict:
+                logger.info("Conflicto al agregar archivo a la sesión; se reintenta", extra={"upload_id": session_id})
+        else:
+            raise HTTPException(status_code=409, detail=CONFLICT_DETAIL)
+        
+        await manager.send_progress({"stage": "complete", "progress": 100, "message": "¡Archivo agregado!"})
+        
+        duplicate_positions = added.pop("duplicate_positions")
+        body = json_payload(
+            **upload_sessions.session_summary(session_id, view),
+            file=added,
+            file_duplicates=frame_to_json(part.iloc[duplicate_positions], shape),
+            db_duplicates=db_check['existing_emails'],
+            preview=frame_to_json(part.head(10), shape)
+        )
+        return await json_response(request, body)
+    
+    except HTTPException:
+        raise
     except Exception as e:
         await manager.send_progress({"stage": "error", "progress": 0, "message": f"Error: {str(e)}"})
         raise HTTPException(status_code=500, detail=str(e))
@@ -230,13 +464,13 @@ async def save_to_database(upload_id: str, skip_duplicates: bool = True):
     Guarda los datos del Excel en la base de datos
     skip_duplicates: si es True, omite emails que ya existen en BD
     """
-    if upload_id not in uploaded_data_cache:
+    cache = await run_in_threadpool(_read_upload, upload_id)
+    if cache is None:
         raise HTTPException(status_code=404, detail="Datos no encontrados. Recarga el archivo.")
     
     try:
         await manager.send_progress({"stage": "saving", "progress": 20, "message": "Preparando inserción..."})
         
-        cache = uploaded_data_cache[upload_id]
         df = cache["original_df"]
         
         # Si skip_duplicates, filtrar emails existentes
@@ -279,45 +513,147 @@ async def save_to_database(upload_id: str, skip_duplicates: bool = True):
 # Endpoint: Obtener datos completos
 # ============================================================
 @router.get("/data/{upload_id}")
-async def get_full_data(upload_id: str):
-    """Obtiene todos los datos cargados"""
-    if upload_id not in uploaded_data_cache:
+async def get_full_data(
+    upload_id: str,
+    request: Request,
+    shape: str = Query("records", pattern=SHAPE_PATTERN),
+    filters: List[str] = Query([]),
+    search: Optional[str] = None,
+    sort: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: Optional[int] = Query(None, ge=1)
+):
+    """
+    Obtiene los datos cargados (serializados directo desde el DataFrame).
+    filters: uno o más "columna:valor" (coincidencia exacta sin mayúsculas; acepta la columna virtual "domain")
+    search: subcadena a buscar en name/email
+    sort: columnas separadas por coma, con "-" para descendente (ej. "domain,-name")
+    page/page_size: paginación sobre el resultado; sin page_size se devuelve todo
+    """
+    from app.utils.data_query import UploadQueryIndex, parse_filters, parse_sort, query_positions
+    
+    cache = await run_in_threadpool(_read_upload, upload_id)
+    if cache is None:
         raise HTTPException(status_code=404, detail="Datos no encontrados")
+    df = cache["original_df"]
     
-    cache = uploaded_data_cache[upload_id]
-    return {
-        "data": cache["data"],
-        "columns": cache["columns"],
-        "total_rows": len(cache["data"])
-    }
+    parsed_filters = parse_filters(filters)
+    sort_keys = parse_sort(sort)
+    
+    if not parsed_filters and not search and not sort_keys and page_size is None:
+        body = json_payload(
+            data=frame_to_json(df, shape),
+            columns=cache["columns"],
+            total_rows=len(df)
+        )
+        return await json_response(request, body)
+    
+    # Índice de consulta reutilizable entre páginas; se invalida al modificar el DataFrame
+    index = cache.get("query_index")
+    if index is None:
+        index = UploadQueryIndex(df, cache.get("email_domain"))
+        cache["query_index"] = index
+    
+    positions = query_positions(index, parsed_filters, search, sort_keys)
+    filtered_rows = len(positions)
+    if page_size is not None:
+        start = (page - 1) * page_size
+        positions = positions[start:start + page_size]
+    
+    body = json_payload(
+        data=frame_to_json(df.iloc[positions], shape),
+        columns=cache["columns"],
+        total_rows=len(df),
+        filtered_rows=filtered_rows,
+        page=page,
+        page_size=page_size
+    )
+    return await json_response(request, body)
 
 
 # ============================================================
 # Endpoint: Eliminar duplicados del archivo
 # ============================================================
 @router.post("/remove-duplicates/{upload_id}")
-async def remove_duplicates(upload_id: str):
-    """Elimina duplicados dentro del archivo Excel"""
-    if upload_id not in uploaded_data_cache:
-        raise HTTPException(status_code=404, detail="Datos no encontrados")
-    
-    cache = uploaded_data_cache[upload_id]
-    df = cache["original_df"]
+async def remove_duplicates(
+    upload_id: str,
+    request: Request,
+    shape: str = Query("records", pattern=SHAPE_PATTERN),
+    include_data: bool = True,
+    mode: str = Query("exact", pattern="^(exact|near)$"),
+    clusters: List[int] = Query([])
+):
+    """
+    Elimina duplicados dentro del archivo Excel
+    include_data: si es False no se devuelve el dataset limpio (solo los conteos)
+    mode: "exact" (mismo email) o "near" (además colapsa en su primera fila los grupos
+          de casi-duplicados indicados en `clusters`)
+    clusters: ids de near_duplicate_clusters confirmados por el cliente (solo mode=near).
+              Las filas descartadas se devuelven en "dropped".
+    """
+    if mode == "near" and not clusters:
+        raise HTTPException(status_code=400, detail="Indica los grupos a colapsar en 'clusters'")
     
-    original_count = len(df)
-    df_clean = df.drop_duplicates(subset=['email'])
-    removed_count = original_count - len(df_clean)
+    def change(cache):
+        df = cache["original_df"]
+        original_count = len(df)
+        dropped = None
+        if mode == "near":
+            known = cache.get("near_duplicate_clusters") or []
+            unknown = sorted({cluster_id for cluster_id in clusters if not 0 <= cluster_id < len(known)})
+            if unknown:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Grupos desconocidos: {unknown}; vuelve a calcularlos con /near-duplicates"
+                )
+            drop_positions = sorted({pos for cluster_id in set(clusters) for pos in known[cluster_id][1:]})
+            dropped = df.iloc[drop_positions]
+            df = df.drop(index=df.index[drop_positions])
+        df_clean = df.drop_duplicates(subset=['email'])
+        
+        # Actualizar caché
+        cache["original_df"] = df_clean
+        refresh_upload(cache)
+        cache.pop("query_index", None)
+        cache["near_duplicate_clusters"] = []
+        return original_count - len(df_clean), df_clean, dropped
     
-    # Actualizar caché
-    uploaded_data_cache[upload_id]["data"] = df_clean.to_dict(orient='records')
-    uploaded_data_cache[upload_id]["original_df"] = df_clean
-    uploaded_data_cache[upload_id]["file_duplicates"] = []
+    removed_count, df_clean, dropped = await run_in_threadpool(_modify_upload, upload_id, change)
     
-    return {
+    fields = {
         "message": f"Se eliminaron {removed_count} duplicados del archivo",
-        "total_rows": len(df_clean),
-        "data": df_clean.to_dict(orient='records')
+        "total_rows": len(df_clean)
     }
+    if dropped is not None:
+        fields["dropped"] = frame_to_json(dropped, shape)
+    if include_data:
+        fields["data"] = frame_to_json(df_clean, shape)
+    return await json_response(request, json_payload(**fields))
+
+
+# ============================================================
+# Endpoint: Recalcular casi-duplicados
+# ============================================================
+@router.post("/near-duplicates/{upload_id}")
+async def detect_near_duplicates(upload_id: str, request: Request):
+    """
+    Agrupa casi-duplicados sobre los datos actuales y guarda los grupos en el upload.
+    No elimina nada: el cliente revisa los grupos y confirma los que quiera colapsar
+    con remove-duplicates?mode=near&clusters=<id>&clusters=<id>...
+    """
+    def change(cache):
+        from app.utils.near_duplicates import find_near_duplicate_clusters
+        df = cache["original_df"]
+        clusters = find_near_duplicate_clusters(df)
+        cache["near_duplicate_clusters"] = clusters
+        return _describe_clusters(df, clusters)
+    
+    described = await run_in_threadpool(_modify_upload, upload_id, change)
+    body = json_payload(
+        near_duplicate_cluster_count=len(described),
+        near_duplicate_clusters=described
+    )
+    return await json_response(request, body)
 
 
 # ============================================================
@@ -326,20 +662,23 @@ async def remove_duplicates(upload_id: str):
 @router.put("/update-cell/{upload_id}")
 async def update_cell(upload_id: str, row_index: int, column: str, value: Any):
     """Actualiza valor de una celda"""
-    if upload_id not in uploaded_data_cache:
-        raise HTTPException(status_code=404, detail="Datos no encontrados")
-    
-    cache = uploaded_data_cache[upload_id]
-    df = cache["original_df"]
-    
-    if row_index >= len(df) or column not in df.columns:
-        raise HTTPException(status_code=400, detail="Índice inválido")
-    
-    df.at[row_index, column] = value
+    def change(cache):
+        df = cache["original_df"]
+        
+        if row_index >= len(df) or column not in df.columns:
+            raise HTTPException(status_code=400, detail="Índice inválido")
+        
+        df.at[row_index, column] = value
+        
+        # Actualizar caché (recompacta por si la asignación cambió el tipo de la columna)
+        cache["original_df"] = df
+        refresh_upload(cache)
+        cache.pop("query_index", None)
+        if column in ('name', 'email'):
+            # Los grupos de casi-duplicados se calcularon sobre los valores anteriores
+            cache["near_duplicate_clusters"] = []
     
-    # Actualizar caché
-    uploaded_data_cache[upload_id]["data"] = df.to_dict(orient='records')
-    uploaded_data_cache[upload_id]["original_df"] = df
+    await run_in_threadpool(_modify_upload, upload_id, change)
     
     return {"message": "Actualizado", "updated_value": value}
 
@@ -350,19 +689,21 @@ async def update_cell(upload_id: str, row_index: int, column: str, value: Any):
 @router.get("/statistics/{upload_id}")
 async def get_statistics(upload_id: str):
     """Genera estadísticas para gráficos"""
-    if upload_id not in uploaded_data_cache:
+    cache = await run_in_threadpool(_read_upload, upload_id)
+    if cache is None:
         raise HTTPException(status_code=404, detail="Datos no encontrados")
-    
-    cache = uploaded_data_cache[upload_id]
     df = cache["original_df"]
     
     # Gráfico de Torta: Dominios de email más comunes
-    df['domain'] = df['email'].str.split('@').str[1]
-    domain_counts = df['domain'].value_counts().head(5)
+    # (desde el categórico cacheado, sin recorrer los emails)
+    domains = cache.get("email_domain")
+    if domains is None:
+        domains = email_domains(df)
+    labels, values = top_domains(domains, 5)
     
     pie_data = {
-        "labels": domain_counts.index.tolist(),
-        "values": domain_counts.values.tolist(),
+        "labels": labels,
+        "values": values,
         "column": "Dominios de Email"
     }
     
@@ -381,16 +722,30 @@ async def get_statistics(upload_id: str):
     }
 
 
+# ============================================================
+# Endpoint: Memoria usada por un upload
+# ============================================================
+@router.get("/memory/{upload_id}")
+async def get_memory(upload_id: str):
+    """Bytes que ocupa el upload cacheado, por columna, índice y dominios."""
+    cache = await run_in_threadpool(_read_upload, upload_id)
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Datos no encontrados")
+    report = memory_report(cache["original_df"], cache.get("email_domain"))
+    return {"upload_id": upload_id, **report}
+
+
 # ============================================================
 # Endpoint: Exportar Excel
 # ============================================================
 @router.get("/export/{upload_id}")
 async def export_excel(upload_id: str):
     """Exporta Excel modificado"""
-    if upload_id not in uploaded_data_cache:
-        raise HTTPException(status_code=404, detail="Datos no encontrados")
+    import pandas as pd
     
-    cache = uploaded_data_cache[upload_id]
+    cache = await run_in_threadpool(_read_upload, upload_id)
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Datos no encontrados")
     df = cache["original_df"]
     
     output = io.BytesIO()
@@ -1,46 +1,236 @@
 """
 Rutas de sistema:
-- GET /api/logs -> lee últimas 50 líneas de un log local (/app/logs/app.log)
+- GET /api/logs -> lee las últimas líneas de un log local (/app/logs/app.log), con filtros opcionales
+- GET /api/logs/stream -> sigue el log en vivo mediante Server-Sent Events (SSE)
 - GET /api/endpoints -> lista rutas registradas
+- GET /api/admission -> estado y contadores del control de admisión de cargas
+- GET /api/db/pools -> latencia por pool (primario/réplicas) y retraso de cada réplica
 - POST /api/restart -> NO IMPLEMENTADO por seguridad (explico cómo hacerlo manual)
 """
 
-from fastapi import APIRouter, FastAPI, Request
+from fastapi import APIRouter, FastAPI, HTTPException, Request, Query
 from fastapi import Depends
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
 import os
-from typing import List
+import re
+from typing import List, Optional
+
+from app.database import pools_status
+from app.logging_config import LOG_PATH
+from app.utils.admission import upload_admission
 
 router = APIRouter(prefix="/api")
 
-LOG_PATH = "/app/logs/app.log"
+# Tamaño de bloque para leer el log desde el final (64 KB por lectura)
+TAIL_BLOCK_SIZE = 64 * 1024
+
+# Intervalo de sondeo del modo "follow" y cada cuánto se envía un latido SSE
+FOLLOW_POLL_SECONDS = 0.5
+FOLLOW_HEARTBEAT_SECONDS = 15.0
+
+# Máximo de bytes que el modo "follow" lee por iteración (fuera del event loop)
+FOLLOW_READ_SIZE = 256 * 1024
+
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+_LEVEL_RE = re.compile(r"\b(DEBUG|INFO|WARNING|ERROR|CRITICAL)\b")
+
+
+# ============================================================
+# Filtros de líneas (substring y nivel mínimo)
+# ============================================================
+def _build_line_filter(contains: Optional[str], level: Optional[str]):
+    """
+    Construye un predicado para filtrar líneas del log.
+    - contains: subcadena a buscar (sin distinguir mayúsculas)
+    - level: nivel mínimo (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+    Retorna None si no hay filtros, para usar la ruta rápida.
+    Un nivel desconocido responde 400 en lugar de ignorarse.
+    """
+    needle = contains.lower() if contains else None
+    min_level = None
+    if level:
+        min_level = LOG_LEVELS.get(level.upper())
+        if min_level is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Nivel inválido: {level}. Usa uno de: {', '.join(LOG_LEVELS)}"
+            )
+
+    if needle is None and min_level is None:
+        return None
+
+    def _match(line: str) -> bool:
+        if needle is not None and needle not in line.lower():
+            return False
+        if min_level is not None:
+            found = _LEVEL_RE.search(line)
+            if not found or LOG_LEVELS[found.group(1)] < min_level:
+                return False
+        return True
+
+    return _match
+
+
+# ============================================================
+# Lectura del final del archivo
+# ============================================================
+def _tail_unfiltered(f, size: int, lines: int) -> List[str]:
+    """
+    Lee bloques desde el final hasta reunir `lines` saltos de línea.
+    Cada bloque se cuenta una sola vez y se hace un único join/split al final.
+    """
+    chunks = []
+    newlines = 0
+    while size > 0 and newlines <= lines:
+        step = min(TAIL_BLOCK_SIZE, size)
+        size -= step
+        f.seek(size)
+        chunk = f.read(step)
+        chunks.append(chunk)
+        newlines += chunk.count(b"\n")
+    chunks.reverse()
+    text = b"".join(chunks).decode(errors="ignore")
+    return text.splitlines()[-lines:]
+
+
+def _tail_filtered(f, size: int, lines: int, match) -> List[str]:
+    """
+    Recorre el archivo hacia atrás por bloques y se detiene cuando
+    ya hay `lines` líneas que cumplen el filtro.
+    La línea parcial al inicio de cada bloque se arrastra al siguiente.
+    """
+    found: List[str] = []
+    carry = b""
+    while size > 0 and len(found) < lines:
+        step = min(TAIL_BLOCK_SIZE, size)
+        size -= step
+        f.seek(size)
+        block = f.read(step) + carry
+        parts = block.split(b"\n")
+        # La primera parte puede estar incompleta salvo que sea el inicio del archivo
+        carry = parts.pop(0) if size > 0 else b""
+        for raw in reversed(parts):
+            line = raw.decode(errors="ignore").rstrip("\r")
+            if line and match(line):
+                found.append(line)
+                if len(found) >= lines:
+                    break
+    found.reverse()
+    return found
+
 
 @router.get("/logs")
-def tail_logs(lines: int = 50):
+def tail_logs(
+    lines: int = Query(50, ge=1, le=10000),
+    contains: Optional[str] = None,
+    level: Optional[str] = None
+):
     """
     Devuelve las últimas `lines` líneas del log si existe.
+    Opcionalmente filtra por subcadena (`contains`) y nivel mínimo (`level`).
     (El contenedor escribe logs locales si configuras logging a archivo)
     """
     if not os.path.exists(LOG_PATH):
         return {"logs": [], "note": f"{LOG_PATH} no existe"}
+
+    match = _build_line_filter(contains, level)
+
     # lee archivo eficientemente desde el final
     with open(LOG_PATH, "rb") as f:
         f.seek(0, os.SEEK_END)
         size = f.tell()
-        blocksize = 1024
-        data = b""
-        while size > 0 and lines > 0:
-            step = min(blocksize, size)
-            f.seek(size-step)
-            chunk = f.read(step)
-            data = chunk + data
-            size -= step
-            # count lines
-            if data.count(b"\n") >= lines:
-                break
-        text = data.decode(errors="ignore")
-    last = text.splitlines()[-lines:]
+        if match is None:
+            last = _tail_unfiltered(f, size, lines)
+        else:
+            last = _tail_filtered(f, size, lines, match)
     return {"logs": last}
 
+
+# ============================================================
+# Seguimiento en vivo (SSE)
+# ============================================================
+async def _follow_log(request: Request, match, from_start: bool):
+    """
+    Generador SSE que emite las líneas nuevas a medida que crece el log.
+    Detecta rotación (cambio de inode) y truncado (tamaño menor a la posición leída):
+    en ambos casos termina de leer el archivo anterior y reabre desde el inicio.
+    Las lecturas se hacen en bloques de FOLLOW_READ_SIZE en un hilo, así un log
+    grande (from_start=True) no bloquea el event loop.
+    """
+    f = None
+    inode = None
+    pending = b""
+    idle = 0.0
+    first_open = True
+
+    try:
+        while not await request.is_disconnected():
+            try:
+                st = os.stat(LOG_PATH)
+            except FileNotFoundError:
+                st = None
+
+            if st is not None and (f is None or st.st_ino != inode or st.st_size < f.tell()):
+                if f is not None:
+                    # Vaciar lo que quede del archivo rotado antes de cambiar
+                    if st.st_ino != inode:
+                        pending += await asyncio.to_thread(f.read)
+                    f.close()
+                f = open(LOG_PATH, "rb")
+                inode = st.st_ino
+                if first_open and not from_start:
+                    f.seek(0, os.SEEK_END)
+                first_open = False
+
+            data = await asyncio.to_thread(f.read, FOLLOW_READ_SIZE) if f is not None else b""
+            if data:
+                pending += data
+
+            if b"\n" in pending:
+                *complete, pending = pending.split(b"\n")
+                for raw in complete:
+                    line = raw.decode(errors="ignore").rstrip("\r")
+                    if line and (match is None or match(line)):
+                        yield f"data: {json.dumps(line, ensure_ascii=False)}\n\n"
+
+            if data:
+                # Puede quedar más por leer: seguir sin esperar
+                idle = 0.0
+                continue
+
+            await asyncio.sleep(FOLLOW_POLL_SECONDS)
+            idle += FOLLOW_POLL_SECONDS
+            if idle >= FOLLOW_HEARTBEAT_SECONDS:
+                # Comentario SSE para mantener viva la conexión a través de proxies
+                yield ": keep-alive\n\n"
+                idle = 0.0
+    finally:
+        if f is not None:
+            f.close()
+
+
+@router.get("/logs/stream")
+async def stream_logs(
+    request: Request,
+    contains: Optional[str] = None,
+    level: Optional[str] = None,
+    from_start: bool = False
+):
+    """
+    Sigue el log en vivo (equivalente a `tail -F`) usando Server-Sent Events.
+    Cada evento contiene una línea serializada como JSON.
+    Los filtros `contains` y `level` se aplican en el servidor.
+    """
+    match = _build_line_filter(contains, level)
+    return StreamingResponse(
+        _follow_log(request, match, from_start),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/endpoints")
 def list_endpoints(request: Request):
     """
@@ -56,6 +246,22 @@ def list_endpoints(request: Request):
             pass
     return {"endpoints": routes}
 
+@router.get("/admission")
+def admission_stats():
+    """
+    Cargas activas, profundidad de la cola, memoria reservada y contadores
+    de rechazos del control de admisión (valores de este proceso).
+    """
+    return upload_admission.stats()
+
+@router.get("/db/pools")
+def db_pools():
+    """
+    Cantidad de consultas y latencias (promedio, máximo, p50/p95/p99) de cada pool,
+    más el retraso de replicación y la salud de cada réplica (valores de este proceso).
+    """
+    return pools_status()
+
 @router.post("/restart")
 def restart_not_allowed():
     """
@@ -1,13 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Response, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-import pandas as pd
+from typing import List, Optional
+import json
+import time
 from io import BytesIO
-from openpyxl import load_workbook
 
 # Importación correcta de schemas y crud
 from app import crud, schemas, models
-from app.database import get_db
+from app.database import get_db, get_read_db, read_session
+from app.utils.domain_stats import domain_stats
+from app.utils.listing_cache import users_cache
+from app.utils.ngram_index import users_ngram_index
+from app.utils.user_events import users_commit, users_inserted
+from app.utils.user_export import EXPORT_FORMATS, PARQUET_AVAILABLE, stream_export
+
+# Filas leídas de MySQL por lote durante la exportación
+EXPORT_BATCH_SIZE = 5000
 
 # Crear router para las rutas relacionadas con usuarios
 router = APIRouter(
@@ -24,13 +33,145 @@ def crear_usuario(usuario: schemas.UsuarioCreate, db: Session = Depends(get_db))
     return crud.crear_usuario(db, usuario)
 
 
-# Listar todos los usuarios
-@router.get("/", response_model=List[schemas.UsuarioRead])
-def listar_usuarios(db: Session = Depends(get_db)):
+# Listar todos los usuarios (el cuerpo sale ya serializado: el modelo solo documenta la respuesta)
+@router.get(
+    "/",
+    response_class=Response,
+    responses={
+        200: {"model": List[schemas.UsuarioRead], "content": {"application/json": {}}},
+        304: {"description": "La versión del cliente (If-None-Match) sigue vigente"},
+    },
+)
+def listar_usuarios(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Retorna una lista de todos los usuarios registrados (o una página con skip/limit).
+    Usa ETag: si el cliente envía If-None-Match vigente se responde 304 sin consultar la BD,
+    y las páginas ya serializadas en la versión actual salen directamente de la caché.
+    La consulta va a una réplica de lectura si hay alguna al día.
+    """
+    etag = users_cache.etag()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if users_cache.matches(request.headers.get("if-none-match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    key = (skip, limit)
+    body = users_cache.get(key)
+    if body is None:
+        # La versión se toma antes de consultar: si cambia durante la consulta no se cachea
+        version = users_cache.version
+        headers["ETag"] = users_cache.etag(version)
+        usuarios = crud.obtener_usuarios_listado(db, skip, limit)
+        body = json.dumps(usuarios, ensure_ascii=False).encode("utf-8")
+        # Desde una réplica, la página solo es confiable si la versión es más antigua
+        # que el retraso (+1 s por la resolución en segundos de MySQL)
+        lag = db.info.get("replica_lag")
+        if lag is None or users_cache.version_age(version) > lag + 1:
+            users_cache.put(version, key, body)
+        else:
+            headers = {"Cache-Control": "no-cache"}
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Estadísticas de la tabla completa (conteos por dominio)
+@router.get("/stats")
+def estadisticas_usuarios():
+    """
+    Total de usuarios y conteo por dominio de email, ordenado de mayor a menor.
+    Se sirve desde agregados mantenidos de forma incremental (ver utils/domain_stats.py),
+    sin consultar la BD; `reconciled_at` indica la última reconciliación con un GROUP BY.
+    """
+    return Response(content=domain_stats.snapshot(), media_type="application/json")
+
+
+# Exportar la tabla completa en streaming
+@router.get("/export")
+def exportar_usuarios(format: str = Query("xlsx", pattern="^(xlsx|csv|parquet)$")):
+    """
+    Descarga todos los usuarios como xlsx, csv o parquet.
+    Las filas se leen con un cursor sin buffer en lotes de EXPORT_BATCH_SIZE y cada
+    lote se escribe directamente en la respuesta: la memoria no crece con la tabla
+    y los primeros bytes salen de inmediato.
+    """
+    if format == "parquet" and not PARQUET_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Exportación Parquet no disponible: falta instalar pyarrow")
+
+    media_type, extension = EXPORT_FORMATS[format]
+
+    def lotes():
+        # La sesión vive dentro del generador: la respuesta se sigue enviando
+        # después de que el endpoint retorna y se cierran sus dependencias
+        with read_session() as db:
+            yield from crud.iterar_usuarios_lotes(db, EXPORT_BATCH_SIZE)
+
+    return StreamingResponse(
+        stream_export(lotes(), format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=usuarios.{extension}"}
+    )
+
+
+# Buscar usuarios por prefijo (y opcionalmente por subcadena/similitud)
+@router.get("/search")
+def buscar_usuarios(
+    q: str = Query(..., min_length=1, max_length=150),
+    limit: int = Query(20, ge=1, le=100),
+    fuzzy: bool = False,
+    db: Session = Depends(get_read_db)
+):
     """
-    Retorna una lista de todos los usuarios registrados.
+    Busca usuarios cuyo email o nombre empiece por `q` (usa los índices de la BD).
+    Con fuzzy=true y el índice de n-gramas habilitado (USERS_NGRAM_INDEX=1) también
+    encuentra coincidencias por subcadena o con errores de tipeo. Mientras el índice
+    se construye (en segundo plano al arrancar), o si la tabla supera USERS_NGRAM_MAX_ROWS,
+    se usa una búsqueda SQL por subcadena.
+    Los resultados se ordenan: email exacto, prefijo de email, nombre exacto, prefijo de nombre, similitud.
     """
-    return crud.obtener_usuarios(db)
+    inicio = time.perf_counter()
+    texto = q.strip().lower()
+
+    por_email, por_nombre = crud.buscar_usuarios_prefijo(db, texto, limit)
+
+    resultados = {}
+
+    def agregar(user_id, name, email, rank, score, match):
+        actual = resultados.get(user_id)
+        if actual is None or rank < actual["rank"]:
+            resultados[user_id] = {"id": user_id, "name": name, "email": email,
+                                   "rank": rank, "score": score, "match": match}
+
+    for row in por_email:
+        exacto = row.email.lower() == texto
+        agregar(row.id, row.name, row.email, 0 if exacto else 1, 1.0, "email")
+    for row in por_nombre:
+        exacto = row.name.lower() == texto
+        agregar(row.id, row.name, row.email, 2 if exacto else 3, 1.0, "name")
+
+    if fuzzy and users_ngram_index.enabled:
+        if users_ngram_index.ready:
+            for user_id, name, email, score in users_ngram_index.search(texto, limit):
+                agregar(user_id, name, email, 4, round(score, 3), "ngram")
+        else:
+            for row in crud.buscar_usuarios_subcadena(db, texto, limit):
+                agregar(row.id, row.name, row.email, 4, 1.0, "substring")
+
+    ordenados = sorted(resultados.values(), key=lambda r: (r["rank"], -r["score"], len(r["email"]), r["id"]))[:limit]
+    for r in ordenados:
+        del r["rank"]
+
+    return {
+        "query": q,
+        "fuzzy": fuzzy and users_ngram_index.enabled,
+        "ngram_ready": users_ngram_index.ready,
+        "results": ordenados,
+        "took_ms": round((time.perf_counter() - inicio) * 1000, 2)
+    }
 
 
 # Eliminar un usuario por ID
@@ -56,6 +197,8 @@ async def importar_excel(
     El archivo debe tener las columnas 'name' y 'email'.
     Cada fila será registrada en la base de datos como un nuevo usuario.
     """
+    # Importación perezosa: openpyxl solo se carga cuando se usa este endpoint
+    from openpyxl import load_workbook
 
     # Validación de extensión del archivo
     if not file.filename.endswith(".xlsx"):
@@ -88,6 +231,7 @@ async def importar_excel(
         idx_email = encabezados.index("email")
 
         # Recorrer filas desde la fila 2 hacia abajo
+        nuevos = []
         for fila in sheet.iter_rows(min_row=2, values_only=True):
             nombre = fila[idx_name]
             email = fila[idx_email]
@@ -102,9 +246,16 @@ async def importar_excel(
                 email=email
             )
             db.add(nuevo_usuario)
+            nuevos.append(nuevo_usuario)
+
+        # flush asigna los IDs; se leen antes del commit para no recargar cada objeto
+        db.flush()
+        insertados = [(u.id, u.name, u.email) for u in nuevos]
 
         # Confirmar cambios
-        db.commit()
+        with users_commit():
+            db.commit()
+            users_inserted(insertados)
 
         return {"mensaje": "Usuarios importados correctamente"}
 
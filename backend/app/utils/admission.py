@@ -0,0 +1,245 @@
+# backend/app/utils/admission.py
+
+"""
+Control de admisión para las cargas de archivos Excel.
+
+Evita que varias cargas grandes simultáneas agoten la memoria del contenedor:
+    - Tamaño máximo por carga, verificado con Content-Length y mientras llega el cuerpo (413).
+    - Cantidad máxima de cargas procesándose a la vez.
+    - Presupuesto de memoria: cada carga reserva tamaño * factor de expansión estimado.
+    - Cola de espera acotada; si está llena (o la espera vence) se responde 429 con Retry-After.
+
+Se aplica como middleware ASGI, antes de que FastAPI lea el multipart, así
+una petición rechazada nunca llega a bufferizarse. Los límites son por proceso.
+
+Variables de entorno:
+    MAX_UPLOAD_BYTES            Tamaño máximo de una carga (por defecto 50 MB).
+    MAX_CONCURRENT_UPLOADS      Cargas procesándose a la vez (por defecto 2).
+    MAX_UPLOAD_QUEUE            Cargas esperando turno (por defecto 4).
+    UPLOAD_QUEUE_TIMEOUT        Segundos máximos de espera en la cola (por defecto 30).
+    UPLOAD_MEMORY_BUDGET_BYTES  Memoria total reservable por cargas (por defecto 1 GB).
+    UPLOAD_MEMORY_FACTOR        Memoria estimada por byte recibido al parsear (por defecto 8).
+    UPLOAD_RETRY_AFTER          Valor de Retry-After en segundos (por defecto 5).
+"""
+
+import asyncio
+import json
+import os
+import re
+from typing import Dict, Optional
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", "2"))
+MAX_UPLOAD_QUEUE = int(os.getenv("MAX_UPLOAD_QUEUE", "4"))
+UPLOAD_QUEUE_TIMEOUT = float(os.getenv("UPLOAD_QUEUE_TIMEOUT", "30"))
+UPLOAD_MEMORY_BUDGET_BYTES = int(os.getenv("UPLOAD_MEMORY_BUDGET_BYTES", str(1024 * 1024 * 1024)))
+UPLOAD_MEMORY_FACTOR = float(os.getenv("UPLOAD_MEMORY_FACTOR", "8"))
+UPLOAD_RETRY_AFTER = int(os.getenv("UPLOAD_RETRY_AFTER", "5"))
+
+# Rutas POST protegidas por el control de admisión
+GUARDED_PATHS = re.compile(r"^/(api/excel/upload|api/excel/sessions/[^/]+/files|usuarios/importar-excel)/?$")
+
+# Archivos de cgroup v2 para conocer la memoria realmente disponible del contenedor
+_CGROUP_MAX = "/sys/fs/cgroup/memory.max"
+_CGROUP_CURRENT = "/sys/fs/cgroup/memory.current"
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def _available_container_memory() -> Optional[int]:
+    """Memoria libre según el límite del cgroup; None si no hay límite o no se puede leer."""
+    try:
+        with open(_CGROUP_MAX) as f:
+            limit = f.read().strip()
+        if limit == "max":
+            return None
+        with open(_CGROUP_CURRENT) as f:
+            current = int(f.read().strip())
+        return int(limit) - current
+    except (OSError, ValueError):
+        return None
+
+
+class AdmissionController:
+    """Semáforo con cola acotada y presupuesto de memoria, más contadores para monitoreo."""
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_UPLOADS,
+        max_queue: int = MAX_UPLOAD_QUEUE,
+        memory_budget: int = UPLOAD_MEMORY_BUDGET_BYTES,
+        memory_factor: float = UPLOAD_MEMORY_FACTOR,
+        queue_timeout: float = UPLOAD_QUEUE_TIMEOUT
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.memory_budget = memory_budget
+        self.memory_factor = memory_factor
+        self.queue_timeout = queue_timeout
+
+        self._cond = asyncio.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._reserved = 0
+
+        self.counters: Dict[str, int] = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_too_large": 0,
+            "rejected_queue_full": 0,
+            "rejected_queue_timeout": 0,
+            "rejected_memory": 0,
+            "aborted_oversize_stream": 0,
+            "max_queue_depth": 0,
+        }
+
+    def estimate(self, content_length: int) -> int:
+        return int(content_length * self.memory_factor)
+
+    def _fits(self, reserve: int) -> bool:
+        return self._active < self.max_concurrent and self._reserved + reserve <= self.memory_budget
+
+    async def acquire(self, content_length: int) -> int:
+        """
+        Espera turno para procesar una carga. Retorna la memoria reservada,
+        que debe devolverse con release(). Lanza AdmissionRejected si no es posible.
+        """
+        reserve = self.estimate(content_length)
+
+        if reserve > self.memory_budget:
+            self.counters["rejected_memory"] += 1
+            raise AdmissionRejected(413, "El archivo excede el presupuesto de memoria del servidor")
+
+        available = _available_container_memory()
+        if available is not None and reserve > available:
+            self.counters["rejected_memory"] += 1
+            raise AdmissionRejected(429, "Memoria insuficiente en este momento", UPLOAD_RETRY_AFTER)
+
+        async with self._cond:
+            if not self._fits(reserve):
+                if self._waiting >= self.max_queue:
+                    self.counters["rejected_queue_full"] += 1
+                    raise AdmissionRejected(429, "Demasiadas cargas en curso, intenta más tarde", UPLOAD_RETRY_AFTER)
+
+                self._waiting += 1
+                self.counters["queued"] += 1
+                self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], self._waiting)
+                try:
+                    await asyncio.wait_for(self._cond.wait_for(lambda: self._fits(reserve)), self.queue_timeout)
+                except asyncio.TimeoutError:
+                    self.counters["rejected_queue_timeout"] += 1
+                    raise AdmissionRejected(429, "Tiempo de espera agotado en la cola de cargas", UPLOAD_RETRY_AFTER)
+                finally:
+                    self._waiting -= 1
+
+            self._active += 1
+            self._reserved += reserve
+            self.counters["admitted"] += 1
+            return reserve
+
+    async def release(self, reserve: int) -> None:
+        async with self._cond:
+            self._active -= 1
+            self._reserved -= reserve
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "queue_depth": self._waiting,
+            "reserved_bytes": self._reserved,
+            "limits": {
+                "max_upload_bytes": MAX_UPLOAD_BYTES,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "memory_budget_bytes": self.memory_budget,
+                "memory_factor": self.memory_factor,
+            },
+            "counters": dict(self.counters),
+        }
+
+
+upload_admission = AdmissionController()
+
+
+# ============================================================
+# Middleware ASGI
+# ============================================================
+async def _send_error(send, status_code: int, detail: str, retry_after: Optional[int] = None) -> None:
+    body = json.dumps({"detail": detail}, ensure_ascii=False).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    if retry_after is not None:
+        headers.append((b"retry-after", str(retry_after).encode()))
+    await send({"type": "http.response.start", "status": status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class UploadAdmissionMiddleware:
+    """
+    Aplica el control de admisión a las rutas de carga antes de leer el cuerpo
+    y corta la petición con 413 si el cuerpo recibido supera MAX_UPLOAD_BYTES.
+    """
+
+    def __init__(self, app, controller: AdmissionController = upload_admission, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.controller = controller
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not GUARDED_PATHS.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        try:
+            content_length = int(headers.get(b"content-length", b"0"))
+        except ValueError:
+            content_length = 0
+
+        if content_length > self.max_bytes:
+            self.controller.counters["rejected_too_large"] += 1
+            await _send_error(send, 413, f"El archivo supera el máximo de {self.max_bytes} bytes")
+            return
+
+        # Sin Content-Length (chunked) se reserva para el peor caso permitido
+        try:
+            reserve = await self.controller.acquire(content_length or self.max_bytes)
+        except AdmissionRejected as rejected:
+            await _send_error(send, rejected.status_code, rejected.detail, rejected.retry_after)
+            return
+
+        received = 0
+        aborted = False
+
+        async def limited_receive():
+            nonlocal received, aborted
+            if aborted:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Se responde 413 de inmediato y la app ve una desconexión del cliente
+                    aborted = True
+                    self.controller.counters["aborted_oversize_stream"] += 1
+                    await _send_error(send, 413, f"El archivo supera el máximo de {self.max_bytes} bytes")
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if not aborted:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not aborted:
+                raise
+        finally:
+            await self.controller.release(reserve)
@@ -0,0 +1,46 @@
+# backend/app/utils/background.py
+
+"""
+Tareas en segundo plano del proceso (bus de progreso, reconciliación de
+dominios, índice de n-gramas, réplicas, calentamiento...).
+
+El event loop solo guarda referencias débiles a las tareas: si nadie más las
+retiene pueden ser recolectadas a mitad de ejecución. Aquí se guardan hasta
+que terminan, sus excepciones se registran en el log (en lugar de perderse
+en silencio) y al cerrar la aplicación se cancelan todas.
+"""
+
+import asyncio
+import logging
+from typing import Coroutine, Set
+
+logger = logging.getLogger(__name__)
+
+_tasks: Set[asyncio.Task] = set()
+
+
+def _finished(task: asyncio.Task) -> None:
+    _tasks.discard(task)
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logger.error("La tarea en segundo plano %s terminó con error: %r", task.get_name(), error,
+                     exc_info=error)
+
+
+def spawn(coro: Coroutine, name: str) -> asyncio.Task:
+    """Lanza `coro` en el loop activo y retiene la tarea hasta que termine."""
+    task = asyncio.get_running_loop().create_task(coro, name=name)
+    _tasks.add(task)
+    task.add_done_callback(_finished)
+    return task
+
+
+async def cancel_all() -> None:
+    """Cancela las tareas pendientes y espera a que terminen (al cerrar la aplicación)."""
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    # Las que corren en un hilo (asyncio.to_thread) dejan de esperarse, el hilo termina solo
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,111 @@
+# backend/app/utils/compact_frame.py
+
+"""
+Representación compacta de los DataFrames cacheados de cada upload.
+
+Tras limpiar un archivo, las columnas de texto quedan como objetos Python
+(un str por celda, ~50 bytes de cabecera cada uno). Para el caché:
+    - Las columnas cuyos valores son todos texto pasan a cadenas respaldadas
+      por Arrow: un único buffer contiguo + offsets por columna.
+    - El dominio del email se guarda aparte como categórico (códigos enteros
+      + un valor por dominio distinto), sin agregar columnas al DataFrame.
+    - El tamaño en bytes de cada upload queda registrado en el caché.
+
+Sin pyarrow instalado las columnas se dejan como están (mismo comportamiento).
+
+pandas y numpy se importan dentro de cada función: importar este módulo
+(desde los routers) no los carga hasta el primer upload.
+"""
+
+import importlib.util
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+@lru_cache(maxsize=1)
+def string_dtype():
+    """Dtype de cadenas Arrow con semántica de NaN (las comparaciones dan bool de numpy)."""
+    if importlib.util.find_spec("pyarrow") is None:
+        return None
+    import numpy as np
+    import pandas as pd
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)  # pandas >= 2.3
+    except TypeError:
+        return pd.StringDtype("pyarrow_numpy")  # pandas 2.1 / 2.2
+
+
+def compact_frame(df: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    Convierte a cadenas Arrow las columnas compuestas solo por texto.
+    Las columnas con nulos o tipos mezclados se dejan igual para no alterar
+    cómo se serializan.
+    """
+    import pandas as pd
+
+    dtype = string_dtype()
+    if dtype is None:
+        return df
+    converted = {}
+    for column in df.columns:
+        series = df[column]
+        if series.dtype == dtype:
+            continue
+        if pd.api.types.infer_dtype(series, skipna=False) == "string":
+            converted[column] = series.astype(dtype)
+    return df.assign(**converted) if converted else df
+
+
+def email_domains(df: "pd.DataFrame") -> Optional["pd.Series"]:
+    """Dominio de cada email como categórico alineado con `df` (None si no hay columna email)."""
+    if "email" not in df.columns:
+        return None
+    return df["email"].str.split("@").str[1].astype("category")
+
+
+def top_domains(domains: "pd.Series", limit: int) -> Tuple[List[Any], List[int]]:
+    """
+    Los `limit` dominios más frecuentes a partir de los códigos del categórico.
+    Los empates se ordenan por primera aparición, igual que value_counts sobre texto.
+    """
+    import numpy as np
+
+    codes = domains.cat.codes.to_numpy()
+    valid = np.flatnonzero(codes >= 0)
+    categories = domains.cat.categories
+    counts = np.bincount(codes[valid], minlength=len(categories))
+    first_seen = np.full(len(categories), len(codes))
+    np.minimum.at(first_seen, codes[valid], valid)
+    order = [i for i in np.lexsort((first_seen, -counts)) if counts[i] > 0][:limit]
+    return [categories[i] for i in order], [int(counts[i]) for i in order]
+
+
+def refresh_upload(cache: Dict[str, Any]) -> None:
+    """
+    Compacta el DataFrame de un upload y recalcula sus derivados
+    (dominios categóricos y bytes en memoria). Llamar tras cada modificación.
+    """
+    df = compact_frame(cache["original_df"])
+    domains = email_domains(df)
+    cache["original_df"] = df
+    cache["email_domain"] = domains
+    cache["memory_bytes"] = memory_report(df, domains)["total_bytes"]
+
+
+def memory_report(df: "pd.DataFrame", domains: Optional["pd.Series"] = None) -> Dict[str, Any]:
+    """Bytes por columna (contando el contenido de las cadenas), índice y dominios."""
+    usage = df.memory_usage(deep=True, index=True)
+    columns = {str(column): int(usage[column]) for column in df.columns}
+    index_bytes = int(usage["Index"])
+    domain_bytes = int(domains.memory_usage(deep=True, index=False)) if domains is not None else 0
+    return {
+        "rows": len(df),
+        "total_bytes": sum(columns.values()) + index_bytes + domain_bytes,
+        "columns": columns,
+        "index_bytes": index_bytes,
+        "email_domain_bytes": domain_bytes,
+        "dtypes": {str(column): str(dtype) for column, dtype in df.dtypes.items()},
+    }
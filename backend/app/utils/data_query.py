@@ -0,0 +1,154 @@
+# backend/app/utils/data_query.py
+
+"""
+Filtros, búsqueda y ordenamiento en el servidor para los datos cacheados de un upload.
+
+Todo se evalúa con operaciones vectorizadas de pandas/numpy sobre posiciones
+(no etiquetas) del DataFrame. Los rangos de ordenamiento por columna se calculan
+una vez y se reutilizan entre páginas hasta que el caché se invalida
+(update_cell o remove_duplicates reemplazan el índice).
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+# Columna virtual derivada del email, usable en filtros y ordenamiento
+DOMAIN_COLUMN = "domain"
+
+# Columnas donde se aplica la búsqueda por subcadena (si existen)
+SEARCH_COLUMNS = ("name", "email")
+
+
+class UploadQueryIndex:
+    """
+    Estructuras precomputadas para consultar un DataFrame cacheado:
+    - rangos densos por columna (para ordenamiento multi-columna con lexsort)
+    - permutaciones ordenadas por columna (para ordenar una página sin volver a ordenar)
+    - versiones en minúsculas de las columnas de texto (para filtros y búsqueda)
+    Se construyen perezosamente, columna por columna.
+    """
+
+    def __init__(self, df: pd.DataFrame, domains: Optional[pd.Series] = None):
+        self.df = df
+        # Dominio del email ya calculado (categórico cacheado junto al upload)
+        self.domains = domains
+        self._ranks: Dict[str, np.ndarray] = {}
+        self._null_ranks: Dict[str, int] = {}
+        self._orders: Dict[Tuple[str, bool], np.ndarray] = {}
+        self._lower: Dict[str, pd.Series] = {}
+
+    def column(self, name: str) -> pd.Series:
+        if name == DOMAIN_COLUMN and DOMAIN_COLUMN not in self.df.columns and "email" in self.df.columns:
+            if self.domains is not None:
+                return self.domains
+            return self.df["email"].str.split("@").str[1]
+        if name not in self.df.columns:
+            raise HTTPException(status_code=400, detail=f"Columna desconocida: {name}")
+        return self.df[name]
+
+    def lower(self, name: str) -> pd.Series:
+        if name not in self._lower:
+            self._lower[name] = self.column(name).astype(str).str.lower()
+        return self._lower[name]
+
+    def rank(self, name: str) -> np.ndarray:
+        """
+        Rango denso de cada fila en la columna; los nulos reciben el rango mayor.
+        Si la columna mezcla tipos no comparables (texto y números desde Excel)
+        se ordena por su representación en texto.
+        """
+        if name not in self._ranks:
+            column = self.column(name)
+            try:
+                codes, uniques = pd.factorize(column, sort=True)
+            except TypeError:
+                codes, uniques = pd.factorize(column.astype(str).where(column.notna()), sort=True)
+            self._ranks[name] = np.where(codes < 0, len(uniques), codes)
+            self._null_ranks[name] = len(uniques)
+        return self._ranks[name]
+
+    def sort_key(self, name: str, descending: bool = False) -> np.ndarray:
+        """Clave de ordenamiento ascendente; en ambos sentidos los nulos quedan al final."""
+        rank = self.rank(name)
+        if not descending:
+            return rank
+        # Invierte solo los valores presentes; el rango de nulos sigue siendo el mayor
+        nulls = self._null_ranks[name]
+        return np.where(rank == nulls, nulls, nulls - 1 - rank)
+
+    def order(self, name: str, descending: bool = False) -> np.ndarray:
+        """Permutación estable que ordena todas las filas por la columna."""
+        key = (name, descending)
+        if key not in self._orders:
+            self._orders[key] = np.argsort(self.sort_key(name, descending), kind="stable")
+        return self._orders[key]
+
+
+def parse_filters(filters: List[str]) -> List[Tuple[str, str]]:
+    """Convierte ["domain:gmail.com", ...] en [("domain", "gmail.com"), ...]."""
+    parsed = []
+    for item in filters:
+        column, sep, value = item.partition(":")
+        if not sep or not column:
+            raise HTTPException(status_code=400, detail=f"Filtro inválido: {item} (usar columna:valor)")
+        parsed.append((column.strip(), value.strip()))
+    return parsed
+
+
+def parse_sort(sort: Optional[str]) -> List[Tuple[str, bool]]:
+    """Convierte "name,-email" en [("name", False), ("email", True)]."""
+    if not sort:
+        return []
+    keys = []
+    for item in sort.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        descending = item.startswith("-")
+        keys.append((item.lstrip("+-"), descending))
+    return keys
+
+
+def query_positions(
+    index: UploadQueryIndex,
+    filters: List[Tuple[str, str]],
+    search: Optional[str],
+    sort_keys: List[Tuple[str, bool]]
+) -> np.ndarray:
+    """
+    Retorna las posiciones de las filas que cumplen filtros y búsqueda,
+    en el orden pedido. Sin filtros ni orden retorna todas las filas.
+    """
+    n = len(index.df)
+    mask: Optional[np.ndarray] = None
+
+    for column, value in filters:
+        current = (index.lower(column) == value.lower()).to_numpy()
+        mask = current if mask is None else mask & current
+
+    if search:
+        needle = search.lower()
+        columns = [c for c in SEARCH_COLUMNS if c in index.df.columns] or list(index.df.columns)
+        found = np.zeros(n, dtype=bool)
+        for column in columns:
+            found |= index.lower(column).str.contains(needle, regex=False).to_numpy()
+        mask = found if mask is None else mask & found
+
+    if not sort_keys:
+        return np.arange(n) if mask is None else np.flatnonzero(mask)
+
+    if len(sort_keys) == 1:
+        # Se reutiliza la permutación precomputada; filtrar no requiere volver a ordenar
+        column, descending = sort_keys[0]
+        order = index.order(column, descending)
+        return order if mask is None else order[mask[order]]
+
+    positions = np.arange(n) if mask is None else np.flatnonzero(mask)
+    # lexsort usa la última clave como principal; es estable, así los empates conservan el orden original
+    keys = []
+    for column, descending in reversed(sort_keys):
+        keys.append(index.sort_key(column, descending)[positions])
+    return positions[np.lexsort(keys)]
@@ -0,0 +1,198 @@
+# backend/app/utils/domain_stats.py
+
+"""
+Agregado de usuarios por dominio de email para toda la tabla `users`.
+
+En lugar de un GROUP BY sobre toda la tabla en cada consulta, los conteos
+viven en shared_state.shared_counters ("domain:<dominio>"), compartidos por
+todos los workers:
+
+    - Cada inserción/eliminación los ajusta de forma incremental (user_events.py),
+      en la misma operación atómica que incrementa la versión de `users`.
+    - Un trabajo periódico los reconcilia con la BD (GROUP BY) para corregir
+      deriva: escrituras hechas fuera de la app, fallos entre commit y ajuste.
+      El resultado solo se aplica si la versión de `users` no cambió mientras
+      se consultaba y no hay escrituras pendientes (confirmadas en la BD pero
+      aún sin ajustar: el GROUP BY ya las ve y su delta llegaría después, con
+      lo que se contarían dos veces); si no, se reintenta en el siguiente ciclo.
+      Una escritura queda pendiente desde antes de su commit hasta su ajuste
+      (user_events.users_commit); si un worker muere entre ambos, la marca se
+      descarta tras PENDING_STALE_SECONDS sin escrituras nuevas.
+      Cada intervalo lo reclama un solo worker (también al arrancar).
+    - GET /usuarios/stats responde desde una copia serializada por proceso que
+      se invalida con el contador "domain_stats": costo constante por consulta.
+
+Variables de entorno:
+    DOMAIN_STATS_RECONCILE_SECONDS  Intervalo de reconciliación (por defecto 600; 0 = desactivado).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+from app.utils.listing_cache import COUNTER_NAME as USERS_COUNTER
+from app.utils.shared_state import shared_counters
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_SECONDS = int(os.getenv("DOMAIN_STATS_RECONCILE_SECONDS", "600"))
+
+DOMAIN_PREFIX = "domain:"
+VERSION_COUNTER = "domain_stats"
+RECONCILED_AT_COUNTER = "domain_stats_reconciled_at"
+RECONCILE_CLAIM_COUNTER = "domain_stats_claimed_at"
+PENDING_COUNTER = "users_pending_writes"
+PENDING_AT_COUNTER = "users_pending_writes_at"
+
+# Un commit y su ajuste toman milisegundos: una marca más antigua es de un worker caído
+PENDING_STALE_SECONDS = 300
+
+# Reconciliación: GROUP BY en MySQL sobre el dominio normalizado
+RECONCILE_QUERY = (
+    "SELECT LOWER(SUBSTRING_INDEX(email, '@', -1)) AS domain, COUNT(*) AS total "
+    "FROM users GROUP BY domain"
+)
+
+
+def email_domain(email: str) -> str:
+    """Dominio en minúsculas, con la misma regla que RECONCILE_QUERY."""
+    return str(email).strip().rsplit("@", 1)[-1].lower()
+
+
+class DomainStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (versión, respuesta serializada) del último snapshot de este proceso
+        self._cached: Tuple[int, Optional[bytes]] = (-1, None)
+
+    # ------------------------------------------------------------
+    # Ajustes incrementales
+    # ------------------------------------------------------------
+    def deltas(self, emails: Iterable[str], sign: int) -> Counter:
+        """
+        Deltas que suman (sign=1) o restan (sign=-1) un usuario por cada email.
+        Se aplican junto con la versión de `users` (ver user_events.py).
+        """
+        deltas = Counter()
+        for email in emails:
+            deltas[DOMAIN_PREFIX + email_domain(email)] += sign
+        if deltas:
+            deltas[VERSION_COUNTER] += 1
+        return deltas
+
+    def begin_write(self) -> None:
+        """Marca una escritura en `users` como pendiente; se llama antes del commit."""
+        shared_counters.set(PENDING_AT_COUNTER, int(time.time()))
+        shared_counters.incr(PENDING_COUNTER)
+
+    def end_write(self) -> None:
+        """Retira la marca de una escritura que no llegó a ajustar los conteos."""
+        shared_counters.add_many({PENDING_COUNTER: -1})
+
+    def _clear_stale_pending(self) -> None:
+        pending = shared_counters.get(PENDING_COUNTER)
+        if not pending:
+            return
+        if time.time() - shared_counters.get(PENDING_AT_COUNTER) < PENDING_STALE_SECONDS:
+            return
+        if shared_counters.compare_and_set(PENDING_COUNTER, pending, 0):
+            logger.warning("Se descartan %s escrituras pendientes sin ajustar (worker caído)", pending)
+
+    # ------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------
+    def snapshot(self) -> bytes:
+        """Respuesta JSON ya serializada; solo se recalcula si cambió la versión."""
+        version = shared_counters.get(VERSION_COUNTER)
+        cached_version, body = self._cached
+        if body is not None and cached_version == version:
+            return body
+
+        counts = {d: c for d, c in shared_counters.items(DOMAIN_PREFIX).items() if c > 0}
+        reconciled_at = shared_counters.get(RECONCILED_AT_COUNTER)
+        body = json.dumps({
+            "total_users": sum(counts.values()),
+            "unique_domains": len(counts),
+            "domains": [
+                {"domain": domain, "count": count}
+                for domain, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+            ],
+            "reconciled_at": reconciled_at or None,
+            "version": version,
+        }, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._cached = (version, body)
+        return body
+
+    # ------------------------------------------------------------
+    # Reconciliación
+    # ------------------------------------------------------------
+    def reconcile(self) -> bool:
+        """
+        Recalcula los conteos con un GROUP BY en el primario.
+        Retorna False si hubo escrituras durante la consulta o quedan escrituras
+        pendientes de ajuste (no se aplica).
+        """
+        from sqlalchemy import text
+        from app.database import SessionLocal, get_engine
+
+        get_engine()
+        self._clear_stale_pending()
+        users_version = shared_counters.get(USERS_COUNTER)
+        with SessionLocal() as db:
+            rows = db.execute(text(RECONCILE_QUERY)).all()
+
+        counts = {domain or "": total for domain, total in rows}
+        guard = {USERS_COUNTER: users_version, PENDING_COUNTER: 0}
+        if not shared_counters.replace_prefix(DOMAIN_PREFIX, counts, guard=guard):
+            logger.info("Reconciliación de dominios descartada: hubo escrituras durante la consulta")
+            return False
+
+        shared_counters.set(RECONCILED_AT_COUNTER, int(time.time()))
+        shared_counters.incr(VERSION_COUNTER)
+        logger.info("Conteos por dominio reconciliados", extra={"domains": len(counts)})
+        return True
+
+    def claim(self) -> Optional[Tuple[int, int]]:
+        """
+        Reclama el intervalo actual para este worker con compare-and-set.
+        Retorna (anterior, nuevo) si lo obtuvo, o None si no toca o lo tomó otro.
+        """
+        claimed_at = shared_counters.get(RECONCILE_CLAIM_COUNTER)
+        now = int(time.time())
+        if now - claimed_at < RECONCILE_SECONDS:
+            return None
+        if not shared_counters.compare_and_set(RECONCILE_CLAIM_COUNTER, claimed_at, now):
+            return None
+        return claimed_at, now
+
+    def _reconcile_claimed(self) -> None:
+        claim = self.claim()
+        if claim is None:
+            return
+        done = False
+        try:
+            done = self.reconcile()
+        finally:
+            if not done:
+                # Se libera el intervalo para reintentar en el siguiente ciclo
+                shared_counters.compare_and_set(RECONCILE_CLAIM_COUNTER, claim[1], claim[0])
+
+    async def run(self) -> None:
+        """Bucle de reconciliación; la primera pasada construye los conteos iniciales."""
+        if RECONCILE_SECONDS <= 0:
+            return
+        while True:
+            try:
+                await asyncio.to_thread(self._reconcile_claimed)
+            except Exception as e:
+                logger.warning("No se pudieron reconciliar los conteos por dominio: %s", e)
+            await asyncio.sleep(min(RECONCILE_SECONDS, 60))
+
+
+domain_stats = DomainStats()
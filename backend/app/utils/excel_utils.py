@@ -1,8 +1,11 @@
+import logging
 import pandas as pd
 from sqlalchemy.orm import Session
 from app.models import User
 from io import BytesIO
 
+logger = logging.getLogger(__name__)
+
 # ==========================================================
 # Función para cargar datos desde un archivo Excel (.xlsx)
 # ==========================================================
@@ -44,10 +47,10 @@ def load_excel_to_db(file, db: Session):
             db.add(user)
 
         db.commit()
-        print("Datos importados correctamente desde el Excel.")
+        logger.info("Datos importados correctamente desde el Excel", extra={"rows": len(df)})
         return {"message": f"Se importaron {len(df)} usuarios correctamente."}
 
     except Exception as e:
         db.rollback()
-        print(f"Error al importar datos: {e}")
+        logger.error("Error al importar datos: %s", e)
         raise e
@@ -0,0 +1,117 @@
+# backend/app/utils/listing_cache.py
+
+"""
+Caché del listado de usuarios con ETag.
+
+Cada escritura sobre la tabla `users` (crud.py, importar_excel,
+insert_users_to_db) incrementa una versión. El ETag se deriva de esa versión,
+de modo que:
+    - Si el cliente envía If-None-Match con el ETag vigente -> 304 sin tocar la BD.
+    - Si la página ya fue serializada en la versión vigente -> se responde desde la caché.
+
+La versión vive en shared_state.shared_counters, así todos los workers
+comparten el mismo ETag y ven las escrituras hechas por los demás.
+Las páginas serializadas se guardan por proceso.
+
+Cuando el listado se lee de una réplica, la página solo se cachea (y recibe
+ETag) si la versión vigente es más antigua que el retraso de la réplica;
+de lo contrario podría quedar guardado un listado anterior a la escritura.
+"""
+
+import threading
+import time
+from typing import Dict, Mapping, Optional, Tuple
+
+from app.utils.shared_state import shared_counters
+
+COUNTER_NAME = "users"
+
+# Cantidad máxima de páginas distintas (skip, limit) guardadas por versión
+MAX_CACHED_PAGES = 64
+
+
+class UsersListingCache:
+    """Guarda respuestas JSON ya serializadas del listado, invalidadas por versión."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Versión a la que pertenecen las páginas guardadas en este proceso
+        self._pages_version = -1
+        self._pages: Dict[Tuple[int, Optional[int]], bytes] = {}
+        # Versión vista más recientemente y momento en que este proceso la vio por primera vez
+        self._seen: Tuple[int, float] = (-1, 0.0)
+
+    @property
+    def version(self) -> int:
+        return shared_counters.get(COUNTER_NAME)
+
+    def etag(self, version: Optional[int] = None) -> str:
+        """ETag débil para la versión indicada (o la vigente)."""
+        if version is None:
+            version = self.version
+        # El token evita que un ETag viejo coincida si el almacenamiento compartido se recrea
+        return f'W/"users-{shared_counters.token}-{version}"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Indica si la cabecera If-None-Match contiene el ETag vigente."""
+        if not if_none_match:
+            return False
+        current = self.etag()
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*" or tag == current:
+                return True
+        return False
+
+    def version_age(self, version: int) -> float:
+        """
+        Segundos desde que este proceso vio `version` por primera vez. Es una cota
+        inferior de la antigüedad real de la escritura, así que es seguro compararla
+        con el retraso de una réplica.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._seen[0] != version:
+                self._seen = (version, now)
+            return now - self._seen[1]
+
+    def get(self, key: Tuple[int, Optional[int]]) -> Optional[bytes]:
+        if self._pages_version != self.version:
+            return None
+        return self._pages.get(key)
+
+    def put(self, version: int, key: Tuple[int, Optional[int]], body: bytes) -> None:
+        """
+        Guarda una página serializada.
+        Se ignora si la versión cambió mientras se consultaba la BD (dato ya obsoleto).
+        """
+        with self._lock:
+            if version != self.version:
+                return
+            if version != self._pages_version:
+                self._pages = {}
+                self._pages_version = version
+            if len(self._pages) >= MAX_CACHED_PAGES:
+                self._pages.clear()
+            self._pages[key] = body
+
+    def bump(self, related: Optional[Mapping[str, int]] = None) -> None:
+        """
+        Marca la tabla como modificada e invalida todas las páginas.
+        `related`: deltas de otros contadores derivados de `users` que deben
+        cambiar en la misma operación atómica que la versión.
+        """
+        with self._lock:
+            if related:
+                shared_counters.add_many({**related, COUNTER_NAME: 1})
+            else:
+                shared_counters.incr(COUNTER_NAME)
+            self._pages = {}
+
+
+users_cache = UsersListingCache()
+
+
+def bump_users_version(related: Optional[Mapping[str, int]] = None) -> None:
+    """Debe llamarse después de cada commit que inserte o elimine usuarios."""
+    users_cache.bump(related)
@@ -0,0 +1,203 @@
+# backend/app/utils/near_duplicates.py
+
+"""
+Detección de casi-duplicados dentro de un archivo cargado.
+
+Compara filas que probablemente son la misma persona aunque el texto no sea
+idéntico (john.doe+x@gmail.com / johndoe@gmail.com, "José Pérez" / "Jose Perez").
+Comparar todos contra todos sería O(n²); en su lugar:
+
+    1. Canonicalización vectorizada del email (minúsculas, sin "+etiqueta",
+       sin puntos en Gmail, googlemail -> gmail). Filas con el mismo email
+       canónico se agrupan directamente, sin comparaciones.
+    2. Bloqueo: solo se comparan filas que comparten una clave de bloque
+       (dominio + prefijo del nombre normalizado, y dominio + prefijo del
+       usuario del email). Dentro de cada bloque se usa vecindario ordenado:
+       cada fila se compara con las siguientes NEIGHBOR_WINDOW filas.
+
+El costo total queda acotado por n * NEIGHBOR_WINDOW * claves de bloque.
+
+Para no fundir homónimos (luis.cruz868 / luis.cruz129 en el mismo dominio):
+    - Usuarios del email con dígitos distintos nunca se consideran la misma persona.
+    - Un grupo solo se une a otro si sus representantes (primera fila de cada
+      grupo) son similares entre sí; las similitudes no se encadenan fila a fila.
+    - Ningún grupo formado por similitud supera MAX_CLUSTER_SIZE filas.
+"""
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+# Dominios equivalentes y dominios donde los puntos del usuario no importan
+DOMAIN_ALIASES = {"googlemail.com": "gmail.com"}
+DOTLESS_DOMAINS = {"gmail.com"}
+
+BLOCK_PREFIX = 4
+NEIGHBOR_WINDOW = 5
+
+# Umbrales de similitud (coeficiente de Dice sobre bigramas de caracteres)
+NAME_THRESHOLD = 0.8
+LOCAL_THRESHOLD = 0.6
+
+# Tamaño máximo de un grupo unido por similitud (los de email canónico idéntico no se limitan)
+MAX_CLUSTER_SIZE = 10
+
+# Filas cuyos bigramas se conservan calculados a la vez (acota la memoria en archivos grandes)
+GRAMS_CACHE_SIZE = 10000
+
+
+def canonical_emails(emails: pd.Series) -> pd.Series:
+    """Email canónico: minúsculas, sin etiqueta "+..." y sin puntos en dominios tipo Gmail."""
+    emails = emails.astype(str).str.strip().str.lower()
+    parts = emails.str.rsplit("@", n=1, expand=True).reindex(columns=[0, 1])
+    local = parts[0].fillna("").str.split("+", n=1).str[0]
+    domain = parts[1].fillna("").replace(DOMAIN_ALIASES)
+    dotless = domain.isin(DOTLESS_DOMAINS)
+    local = local.where(~dotless, local.str.replace(".", "", regex=False))
+    return local + "@" + domain
+
+
+def normalize_names(names: pd.Series) -> pd.Series:
+    """Nombre sin acentos ni signos, en minúsculas y con las palabras ordenadas."""
+    names = (
+        names.astype(str)
+        .str.normalize("NFKD")
+        .str.encode("ascii", "ignore")
+        .str.decode("ascii")
+        .str.lower()
+        .str.replace(r"[^a-z0-9]+", " ", regex=True)
+        .str.strip()
+    )
+    return names.str.split().map(lambda tokens: " ".join(sorted(tokens)) if isinstance(tokens, list) else "")
+
+
+class _UnionFind:
+    def __init__(self, parent: List[int]):
+        self.parent = parent
+        self.size = np.bincount(parent, minlength=len(parent)).tolist()
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def union(self, a: int, b: int, max_size: int) -> bool:
+        """Une los grupos de `a` y `b` si el resultado no supera `max_size` filas."""
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb or self.size[ra] + self.size[rb] > max_size:
+            return False
+        root, child = min(ra, rb), max(ra, rb)
+        self.parent[child] = root
+        self.size[root] += self.size[child]
+        return True
+
+
+def _bigrams(text: str) -> set:
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _dice(a: set, b: set) -> float:
+    """Coeficiente de Dice entre dos conjuntos de bigramas."""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class _Rows:
+    """Nombre, usuario del email y sus dígitos por fila; los bigramas se calculan al usarlos."""
+
+    def __init__(self, names: List[str], locals_: List[str], digits: List[str]):
+        self.names = names
+        self.locals = locals_
+        self.digits = digits
+        self._grams: dict = {}
+
+    def grams(self, pos: int) -> tuple:
+        grams = self._grams.get(pos)
+        if grams is None:
+            if len(self._grams) >= GRAMS_CACHE_SIZE:
+                self._grams.clear()
+            grams = (_bigrams(self.names[pos]), _bigrams(self.locals[pos]))
+            self._grams[pos] = grams
+        return grams
+
+    def similar(self, a: int, b: int) -> bool:
+        if self.digits[a] != self.digits[b]:
+            return False
+        names_a, locals_a = self.grams(a)
+        names_b, locals_b = self.grams(b)
+        return _dice(names_a, names_b) >= NAME_THRESHOLD and _dice(locals_a, locals_b) >= LOCAL_THRESHOLD
+
+
+def _compare_blocks(uf: _UnionFind, keys: pd.Series, order_by: pd.Series, rows: _Rows, window: int) -> None:
+    """
+    Vecindario ordenado dentro de cada bloque de tamaño >= 2: cada fila se compara
+    con las `window` anteriores de su bloque. La comparación se hace entre los
+    representantes de ambos grupos, así A~B y B~C no bastan para unir A con C.
+    """
+    frame = pd.DataFrame({"key": keys.to_numpy(), "order": order_by.to_numpy(), "pos": np.arange(len(keys))})
+    frame = frame[frame["key"].map(frame["key"].value_counts()) > 1]
+    if frame.empty:
+        return
+    frame = frame.sort_values(["key", "order"], kind="stable")
+
+    find = uf.find
+    recent: List[int] = []
+    current_key = None
+    for pos, key in zip(frame["pos"].tolist(), frame["key"].tolist()):
+        if key != current_key:
+            recent.clear()
+            current_key = key
+        for other in recent:
+            root, other_root = find(pos), find(other)
+            if root != other_root and rows.similar(root, other_root):
+                uf.union(root, other_root, MAX_CLUSTER_SIZE)
+        recent.append(pos)
+        if len(recent) > window:
+            recent.pop(0)
+
+
+def find_near_duplicate_clusters(df: pd.DataFrame, window: int = NEIGHBOR_WINDOW) -> List[List[int]]:
+    """
+    Retorna grupos de posiciones (iloc) que parecen la misma persona.
+    Solo se informan grupos con al menos dos emails distintos: los duplicados
+    exactos ya se reportan como file_duplicates.
+    """
+    n = len(df)
+    if n < 2:
+        return []
+
+    canon = canonical_emails(df["email"])
+    split = canon.str.rsplit("@", n=1)
+    domain = split.str[1].fillna("")
+    local = split.str[0].fillna("").str.replace(r"[._\-]", "", regex=True)
+    digits = local.str.replace(r"\D+", "", regex=True)
+    names = normalize_names(df["name"])
+
+    # 1. Mismo email canónico: cada fila apunta a la primera de su grupo (sin comparaciones)
+    codes = pd.factorize(canon)[0]
+    first = pd.Series(np.arange(n)).groupby(codes).transform("min").tolist()
+    uf = _UnionFind(first)
+
+    # 2. Bloques por nombre y por usuario del email, comparando vecinos cercanos
+    rows = _Rows(names.tolist(), local.tolist(), digits.tolist())
+    _compare_blocks(uf, domain + "|" + names.str[:BLOCK_PREFIX], names, rows, window)
+    _compare_blocks(uf, domain + "|" + local.str[:BLOCK_PREFIX], local, rows, window)
+
+    roots = np.fromiter((uf.find(i) for i in range(n)), dtype=np.int64, count=n)
+    # Solo se agrupan en Python las filas que pertenecen a grupos de 2 o más
+    multi = np.flatnonzero(np.bincount(roots, minlength=n)[roots] >= 2)
+    emails = df["email"].astype(str).to_numpy()
+    clusters = []
+    for _, members in pd.Series(multi).groupby(roots[multi]):
+        rows = members.tolist()
+        if len(set(emails[rows])) > 1:
+            clusters.append(rows)
+    return clusters
@@ -0,0 +1,270 @@
+# backend/app/utils/ngram_index.py
+
+"""
+Índice de n-gramas en memoria para búsqueda por subcadena y tolerante a errores.
+
+Cada usuario se descompone en trigramas de su nombre y email (en minúsculas).
+Una consulta se responde contando cuántos trigramas comparte cada candidato
+con el texto buscado, sin recorrer la tabla completa.
+
+Es opcional (USERS_NGRAM_INDEX=1):
+    - Se construye en segundo plano al arrancar (run()); mientras no está listo
+      la búsqueda usa la consulta SQL por subcadena.
+    - Cada alta/baja se publica en el registro de cambios compartido
+      (shared_state.change_log) y se aplica de inmediato en el worker que la hizo.
+      Todos los workers leen ese registro periódicamente, así ven también las
+      escrituras de los demás. La construcción toma la posición del registro
+      antes de leer la BD y luego aplica lo ocurrido mientras tanto.
+    - Los trigramas demasiado frecuentes (ej. "com") no se recorren al buscar.
+
+Memoria: el índice vive completo en cada worker. Las listas de ids son arrays
+ordenados de enteros de 4 bytes (no sets de objetos int), así cada usuario
+cuesta unos 0,5 KB (nombre, email y ~40 entradas de trigramas): ~100 MB por
+worker con el límite por defecto de 200.000 usuarios. Si la tabla lo supera
+(al construir o por altas posteriores), el índice se descarta en ese worker y
+la búsqueda vuelve a la consulta SQL por subcadena hasta reiniciar.
+
+Variables de entorno:
+    USERS_NGRAM_INDEX          Habilita el índice (por defecto 0).
+    USERS_NGRAM_SYNC_SECONDS   Cada cuánto se leen los cambios de otros workers (por defecto 1).
+    USERS_NGRAM_MAX_POSTINGS   Trigramas con más usuarios que esto se ignoran al buscar (por defecto 10000).
+    USERS_NGRAM_MAX_ROWS       Usuarios máximos indexados por worker (por defecto 200000).
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Set, Tuple
+
+from app.utils.shared_state import change_log
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZE = 3
+
+# Fracción mínima de trigramas de la consulta que debe compartir un candidato
+MIN_SIMILARITY = 0.5
+
+SYNC_SECONDS = float(os.getenv("USERS_NGRAM_SYNC_SECONDS", "1"))
+MAX_POSTINGS = int(os.getenv("USERS_NGRAM_MAX_POSTINGS", "10000"))
+MAX_ROWS = int(os.getenv("USERS_NGRAM_MAX_ROWS", "200000"))
+
+# Ids de usuario (INTEGER de MySQL): 4 bytes por entrada
+POSTING_TYPECODE = "i"
+
+# Espera antes de reintentar una construcción fallida (ej. BD aún no disponible)
+RETRY_SECONDS = 30
+
+# Tipos de cambio en el registro compartido
+INSERTED = "users_inserted"
+DELETED = "users_deleted"
+
+
+def _ngrams(text: str, n: int = NGRAM_SIZE) -> Set[str]:
+    text = text.lower()
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class NGramIndex:
+    """Listas invertidas trigrama -> ids de usuario (array ordenado)."""
+
+    def __init__(self, n: int = NGRAM_SIZE):
+        self.n = n
+        self.enabled = os.getenv("USERS_NGRAM_INDEX", "0").lower() in ("1", "true", "yes")
+        self.ready = False
+        # True si la tabla superó MAX_ROWS: la búsqueda queda en SQL
+        self.over_limit = False
+        self._lock = threading.RLock()
+        self._docs: Dict[int, Tuple[str, str]] = {}
+        self._postings: Dict[str, array] = {}
+        # Último cambio del registro compartido ya aplicado
+        self._position = 0
+
+    def _grams_for(self, name: str, email: str) -> Set[str]:
+        return _ngrams(name or "", self.n) | _ngrams(email or "", self.n)
+
+    # ------------------------------------------------------------
+    # Construcción
+    # ------------------------------------------------------------
+    def build(self, rows: Iterable[Tuple[int, str, str]], position: int) -> None:
+        """
+        Construye el índice completo (reemplaza el contenido previo) y aplica los
+        cambios registrados después de `position`. Las búsquedas no se bloquean
+        mientras se leen las filas: el índice nuevo se arma aparte.
+        Si hay más de MAX_ROWS usuarios no se construye (ver over_limit).
+        """
+        docs: Dict[int, Tuple[str, str]] = {}
+        postings: Dict[str, array] = {}
+        for user_id, name, email in rows:
+            self._add(docs, postings, user_id, name, email)
+            if len(docs) > MAX_ROWS:
+                with self._lock:
+                    self._discard()
+                return
+
+        with self._lock:
+            self._docs, self._postings = docs, postings
+            self._position = position
+            self.ready = True
+        self.sync()
+
+    def rebuild_from_db(self) -> None:
+        from app import crud
+        from app.database import SessionLocal, get_engine
+
+        get_engine()
+        # La posición se toma antes de leer: lo que cambie durante la lectura se aplica después
+        position = change_log.last_id()
+        with SessionLocal() as db:
+            self.build(crud.iterar_usuarios(db), position)
+        if self.over_limit:
+            return
+        logger.info("Índice de n-gramas construido", extra={"users": len(self._docs), "position": position})
+
+    # ------------------------------------------------------------
+    # Cambios
+    # ------------------------------------------------------------
+    def _add(self, docs, postings, user_id: int, name: str, email: str) -> None:
+        docs[user_id] = (name, email)
+        for gram in self._grams_for(name, email):
+            ids = postings.get(gram)
+            if ids is None:
+                postings[gram] = array(POSTING_TYPECODE, (user_id,))
+            elif ids[-1] < user_id:
+                # Caso habitual: los ids nuevos son mayores que los existentes
+                ids.append(user_id)
+            else:
+                pos = bisect_left(ids, user_id)
+                if ids[pos] != user_id:
+                    ids.insert(pos, user_id)
+
+    def _remove(self, user_id: int) -> None:
+        doc = self._docs.pop(user_id, None)
+        if doc is None:
+            return
+        for gram in self._grams_for(*doc):
+            ids = self._postings.get(gram)
+            if ids is None:
+                continue
+            pos = bisect_left(ids, user_id)
+            if pos < len(ids) and ids[pos] == user_id:
+                ids.pop(pos)
+                if not ids:
+                    del self._postings[gram]
+
+    def _discard(self) -> None:
+        """Libera el índice al superar MAX_ROWS; la búsqueda vuelve a SQL."""
+        self._docs, self._postings = {}, {}
+        self.ready = False
+        self.over_limit = True
+
+    def _apply(self, kind: str, payload) -> None:
+        if self.over_limit:
+            return
+        if kind == INSERTED:
+            for user_id, name, email in payload:
+                self._add(self._docs, self._postings, user_id, name, email)
+            if len(self._docs) > MAX_ROWS:
+                self._discard()
+        elif kind == DELETED:
+            for user_id in payload:
+                self._remove(user_id)
+
+    def _record(self, kind: str, payload) -> None:
+        """Publica el cambio para los demás workers y lo aplica aquí si el índice está listo."""
+        if not self.enabled:
+            return
+        change_log.append(kind, payload)
+        if self.ready:
+            with self._lock:
+                self._apply(kind, payload)
+
+    def add_many(self, rows: Iterable[Tuple[int, str, str]]) -> None:
+        self._record(INSERTED, [list(row) for row in rows])
+
+    def remove_many(self, user_ids: Iterable[int]) -> None:
+        self._record(DELETED, list(user_ids))
+
+    def sync(self) -> bool:
+        """
+        Aplica los cambios del registro posteriores a la última posición
+        (incluidos los propios: aplicarlos de nuevo no altera el resultado).
+        Retorna False si el registro ya descartó cambios pendientes.
+        """
+        while True:
+            changes = change_log.read(self._position)
+            if changes is None:
+                return False
+            if not changes:
+                return True
+            with self._lock:
+                for change_id, kind, payload in changes:
+                    self._apply(kind, payload)
+                    self._position = change_id
+
+    async def run(self) -> None:
+        """Construye el índice en segundo plano y luego lo mantiene al día con el registro."""
+        if not self.enabled:
+            return
+        stale = True
+        while not self.over_limit:
+            try:
+                if stale:
+                    await asyncio.to_thread(self.rebuild_from_db)
+                    stale = False
+                else:
+                    stale = not await asyncio.to_thread(self.sync)
+                    if stale:
+                        logger.warning("Índice de n-gramas atrasado respecto del registro de cambios; se reconstruye")
+                        continue
+            except Exception as e:
+                logger.warning("No se pudo actualizar el índice de n-gramas: %s", e)
+                await asyncio.sleep(RETRY_SECONDS)
+                continue
+            await asyncio.sleep(SYNC_SECONDS)
+        logger.warning("Índice de n-gramas descartado: la tabla supera USERS_NGRAM_MAX_ROWS=%s", MAX_ROWS)
+
+    # ------------------------------------------------------------
+    # Búsqueda
+    # ------------------------------------------------------------
+    def search(self, query: str, limit: int) -> List[Tuple[int, str, str, float]]:
+        """
+        Retorna [(id, name, email, score)] ordenado por similitud descendente.
+        score = trigramas compartidos / trigramas selectivos de la consulta. Los
+        trigramas con más de MAX_POSTINGS usuarios no se recorren; si todos lo son,
+        no hay resultados por similitud (quedan los de prefijo).
+        """
+        grams = _ngrams(query, self.n)
+        if not grams:
+            return []
+
+        with self._lock:
+            postings = [self._postings.get(gram, ()) for gram in grams]
+            selective = [ids for ids in postings if len(ids) <= MAX_POSTINGS]
+            if not selective:
+                return []
+
+            counts: Counter = Counter()
+            for ids in selective:
+                counts.update(ids)
+
+            needed = max(1, int(len(selective) * MIN_SIMILARITY))
+            results = []
+            for user_id, shared in counts.items():
+                if shared < needed:
+                    continue
+                name, email = self._docs[user_id]
+                results.append((user_id, name, email, shared / len(selective)))
+
+        # Mayor similitud primero; a igualdad, textos más cortos (coincidencia más precisa)
+        results.sort(key=lambda r: (-r[3], len(r[2]), r[0]))
+        return results[:limit]
+
+
+users_ngram_index = NGramIndex()
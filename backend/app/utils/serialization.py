@@ -0,0 +1,142 @@
+# backend/app/utils/serialization.py
+
+"""
+Serialización rápida de DataFrames a JSON y compresión negociada.
+
+En lugar de convertir el DataFrame a una lista de diccionarios y dejar que
+FastAPI codifique fila por fila, se usa el codificador en C de pandas
+(`to_json`), que trabaja directamente sobre los datos columnares.
+
+Formas de payload soportadas:
+    - "records": [{"name": ..., "email": ...}, ...]  (compatible con la respuesta previa)
+    - "columns": {"name": [...], "email": [...]}     (compacta: no repite las claves por fila)
+"""
+
+import datetime
+import gzip
+import json
+from typing import Any, TYPE_CHECKING
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+
+try:
+    import brotli  # Opcional: si no está instalado solo se ofrece gzip
+except ImportError:
+    brotli = None
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Por debajo de este tamaño la compresión no compensa el costo de CPU
+COMPRESS_MIN_BYTES = 4 * 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+# Desde este tamaño se comprime en el threadpool para no bloquear el event loop;
+# por debajo, comprimir cuesta menos que el salto de hilo
+COMPRESS_THREADPOOL_BYTES = 64 * 1024
+
+# Decimales de los float: 15 es el máximo de to_json (el valor por defecto, 10, trunca)
+DOUBLE_PRECISION = 15
+
+# Tipos inferidos de columnas object que pueden contener fechas/horas
+_DATE_INFERRED = {"datetime", "datetime64", "date", "time", "mixed"}
+
+
+class RawJSON(bytes):
+    """Fragmento JSON ya codificado que se inserta tal cual en el payload."""
+
+
+def _isoformat(value: Any) -> Any:
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def _dates_as_isoformat(df: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    Convierte fechas y horas a texto con `isoformat()`, el mismo formato que
+    usaba jsonable_encoder ("2024-01-05T00:00:00"); to_json agregaría milisegundos.
+    Solo se recorren elemento a elemento las columnas que pueden contenerlas.
+    """
+    import pandas as pd
+
+    converted = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            converted[col] = series.astype(object).map(_isoformat, na_action="ignore")
+        elif series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) in _DATE_INFERRED:
+            converted[col] = series.map(_isoformat, na_action="ignore")
+    return df.assign(**converted) if converted else df
+
+
+def frame_to_json(df: "pd.DataFrame", shape: str = "records") -> RawJSON:
+    """
+    Codifica un DataFrame a JSON (bytes UTF-8) sin pasar por objetos Python por fila.
+    Los NaN se convierten en null, los float se escriben con DOUBLE_PRECISION
+    decimales y las fechas con `isoformat()`, como la respuesta previa.
+    """
+    df = _dates_as_isoformat(df)
+    options = {"double_precision": DOUBLE_PRECISION, "force_ascii": False}
+    if shape == "columns":
+        parts = [
+            json.dumps(str(col), ensure_ascii=False).encode("utf-8") + b":" +
+            df[col].to_json(orient="values", **options).encode("utf-8")
+            for col in df.columns
+        ]
+        return RawJSON(b"{" + b",".join(parts) + b"}")
+
+    return RawJSON(df.to_json(orient="records", **options).encode("utf-8"))
+
+
+def json_payload(**fields: Any) -> bytes:
+    """
+    Construye un objeto JSON a partir de valores normales y fragmentos RawJSON.
+    Los RawJSON se concatenan sin volver a decodificarlos.
+    """
+    parts = []
+    for key, value in fields.items():
+        encoded = value if isinstance(value, RawJSON) else json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+        parts.append(json.dumps(key).encode("utf-8") + b":" + encoded)
+    return b"{" + b",".join(parts) + b"}"
+
+
+def _accepted_encodings(request: Request) -> set:
+    """Lee Accept-Encoding descartando las codificaciones con q=0."""
+    accepted = set()
+    for item in request.headers.get("accept-encoding", "").split(","):
+        token, _, params = item.strip().partition(";")
+        params = params.replace(" ", "")
+        if token and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(token.lower())
+    return accepted
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+async def json_response(request: Request, body: bytes, status_code: int = 200) -> Response:
+    """
+    Respuesta JSON con compresión negociada: brotli si el cliente la acepta y
+    está disponible, si no gzip. Los cuerpos pequeños se envían sin comprimir;
+    los grandes se comprimen en el threadpool.
+    """
+    headers = {"Vary": "Accept-Encoding"}
+
+    if len(body) >= COMPRESS_MIN_BYTES:
+        accepted = _accepted_encodings(request)
+        encoding = "br" if brotli is not None and "br" in accepted else ("gzip" if "gzip" in accepted else None)
+        if encoding is not None:
+            if len(body) >= COMPRESS_THREADPOOL_BYTES:
+                body = await run_in_threadpool(_compress, body, encoding)
+            else:
+                body = _compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
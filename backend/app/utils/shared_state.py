@@ -0,0 +1,811 @@
+# backend/app/utils/shared_state.py
+
+"""
+Estado compartido entre procesos (workers de uvicorn).
+
+Con `uvicorn --workers N` cada worker tiene su propia memoria: un upload
+guardado por un worker no existe para los demás y el progreso enviado por
+uno no llega a los WebSocket conectados a otro. Este módulo ofrece backends
+intercambiables para:
+
+    - UploadStore:    datos cacheados de cada upload (dict por upload_id)
+    - ProgressBus:    publicación/suscripción de mensajes de progreso
+    - SharedCounters: contadores de versión (ej. versión de la tabla users)
+    - ChangeLog:      registro ordenado de cambios recientes (ej. altas/bajas de
+                      usuarios) que cada worker aplica a sus estructuras en memoria
+
+Backends (variable UPLOAD_STORE):
+    "sqlite" (por defecto): archivo SQLite local en UPLOAD_STORE_PATH, compartido
+                            por todos los workers del contenedor (o por réplicas
+                            que monten el mismo volumen).
+    "memory":               diccionarios en proceso (un solo worker, sin E/S).
+
+Para otro backend (ej. Redis) basta implementar las mismas clases base.
+
+Las entradas de upload se escriben con compare-and-set sobre su versión:
+si otro worker la modificó desde que se leyó, put() lanza UploadConflict
+(los routers la reintentan o responden 409). Una entrada puede además crecer
+por partes (append_part): se agrega solo la parte nueva, sin reescribir la
+entrada; la siguiente escritura completa (put) reemplaza entrada y partes.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_STORE_BACKEND = os.getenv("UPLOAD_STORE", "sqlite").lower()
+UPLOAD_STORE_PATH = os.getenv("UPLOAD_STORE_PATH", "/app/data/upload_state.db")
+
+# Uploads sin modificar por más de este tiempo se eliminan del almacenamiento compartido
+UPLOAD_TTL_SECONDS = int(os.getenv("UPLOAD_TTL_SECONDS", str(24 * 3600)))
+
+# Copias deserializadas que conserva cada worker (las menos usadas se descartan)
+UPLOAD_MEMO_MAX = int(os.getenv("UPLOAD_MEMO_MAX", "8"))
+UPLOAD_MEMO_SECONDS = int(os.getenv("UPLOAD_MEMO_SECONDS", "900"))
+
+# Intervalo de sondeo del bus de progreso y retención de los mensajes
+PROGRESS_POLL_SECONDS = 0.1
+PROGRESS_RETENTION_SECONDS = 60
+
+# Retención del registro de cambios: un worker más atrasado que esto debe reconstruir
+CHANGE_LOG_RETENTION_SECONDS = int(os.getenv("CHANGE_LOG_RETENTION_SECONDS", "600"))
+
+# Versión con la que se leyó una entrada (la usa put() para el compare-and-set)
+VERSION_KEY = "store_version"
+
+# Versión de la última escritura completa (put); las partes agregadas después la conservan
+BASE_KEY = "store_base_version"
+
+# Claves de un upload que solo tienen sentido en el proceso actual (no se serializan)
+LOCAL_ONLY_KEYS = ("query_index", VERSION_KEY, BASE_KEY)
+
+# Partes de una entrada: (seq, parte), con seq creciente
+Part = Tuple[int, Any]
+
+
+class UploadConflict(Exception):
+    """La entrada cambió (u otra petición la eliminó) desde que se leyó."""
+
+
+# ============================================================
+# Conexión SQLite por hilo
+# ============================================================
+class _SQLiteDB:
+    """Una conexión por hilo al mismo archivo, en modo WAL para lecturas concurrentes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS uploads (
+                    upload_id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    payload BLOB NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS upload_parts (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    upload_id TEXT NOT NULL,
+                    payload BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_upload_parts_upload ON upload_parts (upload_id, seq);
+                CREATE TABLE IF NOT EXISTS progress_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS change_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                """
+            )
+            # Archivos creados antes de las partes: se agrega la columna base_version
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(uploads)")}
+            if "base_version" not in columns:
+                try:
+                    conn.execute("ALTER TABLE uploads ADD COLUMN base_version INTEGER NOT NULL DEFAULT 0")
+                except sqlite3.OperationalError:
+                    pass  # otro worker la agregó al mismo tiempo
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def _resolve_sqlite_path() -> str:
+    """Usa UPLOAD_STORE_PATH; si su carpeta no es escribible (desarrollo local) usa el temporal."""
+    try:
+        os.makedirs(os.path.dirname(UPLOAD_STORE_PATH), exist_ok=True)
+        return UPLOAD_STORE_PATH
+    except OSError:
+        return os.path.join(tempfile.gettempdir(), "upload_state.db")
+
+
+# ============================================================
+# Almacenamiento de uploads
+# ============================================================
+class UploadStore(ABC):
+    """
+    Interfaz tipo diccionario: `upload_id in store`, `store[upload_id]`,
+    `store[upload_id] = entry`. Las modificaciones a una entrada deben
+    guardarse de nuevo con `store[upload_id] = entry` para verse en otros workers.
+    Una entrada leída lleva su versión en VERSION_KEY; al guardarla, si la versión
+    almacenada ya es otra se lanza UploadConflict. Sin VERSION_KEY (entrada nueva)
+    solo se guarda si el upload_id no existe.
+
+    append_part() agrega una parte sin reescribir la entrada (también con
+    compare-and-set); get() devuelve solo la entrada y read_parts() sus partes.
+    put() guarda la entrada completa: descarta las partes, que quien la armó ya
+    debe haber incorporado.
+    """
+
+    @abstractmethod
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def put(self, upload_id: str, entry: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, upload_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def append_part(self, upload_id: str, version: int, part: Any) -> Tuple[int, int]:
+        """
+        Agrega `part` si la entrada sigue en `version` (si no, UploadConflict).
+        Retorna (nueva versión, seq de la parte).
+        """
+
+    @abstractmethod
+    def read_parts(self, upload_id: str, after: int = 0) -> Optional[Tuple[int, int, List[Part]]]:
+        """
+        (versión, versión base, partes con seq > after), leídos de forma consistente.
+        La versión base es la de la última escritura completa. None si no existe.
+        """
+
+    def __contains__(self, upload_id: str) -> bool:
+        return self.get(upload_id) is not None
+
+    def __getitem__(self, upload_id: str) -> Dict[str, Any]:
+        entry = self.get(upload_id)
+        if entry is None:
+            raise KeyError(upload_id)
+        return entry
+
+    def __setitem__(self, upload_id: str, entry: Dict[str, Any]) -> None:
+        self.put(upload_id, entry)
+
+    def __delitem__(self, upload_id: str) -> None:
+        self.delete(upload_id)
+
+
+class MemoryUploadStore(UploadStore):
+    """
+    Uploads en memoria del proceso (comportamiento original, un solo worker).
+    Las peticiones que leen la misma entrada comparten el objeto, así que el
+    control de versión detecta entradas reemplazadas, eliminadas o con partes nuevas.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, Any]] = {}
+        self._parts: Dict[str, List[Part]] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def get(self, upload_id):
+        return self._data.get(upload_id)
+
+    def put(self, upload_id, entry):
+        with self._lock:
+            current = self._data.get(upload_id)
+            expected = entry.get(VERSION_KEY)
+            if (current is None) != (expected is None) or (current is not None and current[VERSION_KEY] != expected):
+                raise UploadConflict(upload_id)
+            version = (expected or 0) + 1
+            entry[VERSION_KEY] = version
+            entry[BASE_KEY] = version
+            self._data[upload_id] = entry
+            self._parts.pop(upload_id, None)
+
+    def delete(self, upload_id):
+        with self._lock:
+            self._data.pop(upload_id, None)
+            self._parts.pop(upload_id, None)
+
+    def append_part(self, upload_id, version, part):
+        with self._lock:
+            current = self._data.get(upload_id)
+            if current is None or current[VERSION_KEY] != version:
+                raise UploadConflict(upload_id)
+            self._seq += 1
+            self._parts.setdefault(upload_id, []).append((self._seq, part))
+            current[VERSION_KEY] = version + 1
+            return version + 1, self._seq
+
+    def read_parts(self, upload_id, after=0):
+        with self._lock:
+            current = self._data.get(upload_id)
+            if current is None:
+                return None
+            parts = [(seq, part) for seq, part in self._parts.get(upload_id, []) if seq > after]
+            return current[VERSION_KEY], current[BASE_KEY], parts
+
+
+class _Memo:
+    """
+    Copias deserializadas por proceso: upload_id -> (versión, entrada).
+    Acotado a UPLOAD_MEMO_MAX entradas (LRU) y a UPLOAD_MEMO_SECONDS sin uso.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items: "OrderedDict[str, Tuple[int, Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._expire()
+            item = self._items.get(key)
+            if item is None or item[0] != version:
+                return None
+            self._items[key] = (item[0], item[1], time.monotonic())
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, key: str, version: int, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._items[key] = (version, entry, time.monotonic())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def _expire(self) -> None:
+        limit = time.monotonic() - self.ttl
+        while self._items:
+            key, item = next(iter(self._items.items()))
+            if item[2] >= limit:
+                break
+            del self._items[key]
+
+
+class SQLiteUploadStore(UploadStore):
+    """
+    Uploads serializados con pickle en SQLite; las partes van en upload_parts,
+    una fila por parte, y solo se serializa la parte nueva.
+    Cada proceso conserva las últimas entradas leídas junto con su versión: mientras
+    la versión en disco no cambie se reutilizan sin volver a deserializar.
+    """
+
+    def __init__(self, db: _SQLiteDB):
+        self._db = db
+        self._memo = _Memo(UPLOAD_MEMO_MAX, UPLOAD_MEMO_SECONDS)
+
+    def get(self, upload_id):
+        row = self._db.connection().execute(
+            "SELECT version FROM uploads WHERE upload_id = ?", (upload_id,)
+        ).fetchone()
+        if row is None:
+            self._memo.pop(upload_id)
+            return None
+
+        entry = self._memo.get(upload_id, row[0])
+        if entry is not None:
+            return entry
+
+        row = self._db.connection().execute(
+            "SELECT version, base_version, payload FROM uploads WHERE upload_id = ?", (upload_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        entry = pickle.loads(row[2])
+        entry[VERSION_KEY] = row[0]
+        entry[BASE_KEY] = row[1]
+        self._memo.put(upload_id, row[0], entry)
+        return entry
+
+    def put(self, upload_id, entry):
+        payload = pickle.dumps(
+            {k: v for k, v in entry.items() if k not in LOCAL_ONLY_KEYS},
+            protocol=pickle.HIGHEST_PROTOCOL
+        )
+        expected = entry.get(VERSION_KEY)
+        now = time.time()
+        conn = self._db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if expected is None:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO uploads (upload_id, version, base_version, payload, updated_at) "
+                    "VALUES (?, 1, 1, ?, ?)",
+                    (upload_id, payload, now)
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE uploads SET version = version + 1, base_version = version + 1, payload = ?, updated_at = ? "
+                    "WHERE upload_id = ? AND version = ?",
+                    (payload, now, upload_id, expected)
+                )
+            if cursor.rowcount != 1:
+                conn.execute("ROLLBACK")
+                # La copia local quedó desactualizada (y quizá modificada): se descarta
+                self._memo.pop(upload_id)
+                raise UploadConflict(upload_id)
+            conn.execute("DELETE FROM upload_parts WHERE upload_id = ?", (upload_id,))
+            # Limpieza oportunista de uploads vencidos (y sus partes)
+            expired = now - UPLOAD_TTL_SECONDS
+            conn.execute(
+                "DELETE FROM upload_parts WHERE upload_id IN (SELECT upload_id FROM uploads WHERE updated_at < ?)",
+                (expired,)
+            )
+            conn.execute("DELETE FROM uploads WHERE updated_at < ?", (expired,))
+            conn.execute("COMMIT")
+        except UploadConflict:
+            raise
+        except Exception:
+            conn.execute("ROLLBACK")
+            self._memo.pop(upload_id)
+            raise
+        version = (expected or 0) + 1
+        entry[VERSION_KEY] = version
+        entry[BASE_KEY] = version
+        self._memo.put(upload_id, version, entry)
+
+    def delete(self, upload_id):
+        conn = self._db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM upload_parts WHERE upload_id = ?", (upload_id,))
+            conn.execute("DELETE FROM uploads WHERE upload_id = ?", (upload_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._memo.pop(upload_id)
+
+    def append_part(self, upload_id, version, part):
+        payload = pickle.dumps(part, protocol=pickle.HIGHEST_PROTOCOL)
+        conn = self._db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "UPDATE uploads SET version = version + 1, updated_at = ? WHERE upload_id = ? AND version = ?",
+                (time.time(), upload_id, version)
+            )
+            if cursor.rowcount != 1:
+                conn.execute("ROLLBACK")
+                raise UploadConflict(upload_id)
+            seq = conn.execute(
+                "INSERT INTO upload_parts (upload_id, payload) VALUES (?, ?)", (upload_id, payload)
+            ).lastrowid
+            conn.execute("COMMIT")
+        except UploadConflict:
+            raise
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return version + 1, seq
+
+    def read_parts(self, upload_id, after=0):
+        conn = self._db.connection()
+        # Una sola transacción de lectura: versión y partes corresponden al mismo instante
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute(
+                "SELECT version, base_version FROM uploads WHERE upload_id = ?", (upload_id,)
+            ).fetchone()
+            rows = [] if row is None else conn.execute(
+                "SELECT seq, payload FROM upload_parts WHERE upload_id = ? AND seq > ? ORDER BY seq",
+                (upload_id, after)
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        if row is None:
+            return None
+        return row[0], row[1], [(seq, pickle.loads(payload)) for seq, payload in rows]
+
+
+# ============================================================
+# Bus de progreso
+# ============================================================
+Deliver = Callable[[dict], Awaitable[None]]
+
+
+class ProgressBus(ABC):
+    """Publica mensajes de progreso y los entrega a los WebSocket locales de cada proceso."""
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+
+    def set_deliver(self, deliver: Deliver) -> None:
+        """Registra la función que envía un mensaje a los WebSocket de este proceso."""
+        self._deliver = deliver
+
+    @abstractmethod
+    async def publish(self, message: dict) -> None:
+        ...
+
+    async def run(self) -> None:
+        """Bucle de suscripción (no hace nada en el backend en memoria)."""
+        return None
+
+
+class MemoryProgressBus(ProgressBus):
+    async def publish(self, message):
+        if self._deliver is not None:
+            await self._deliver(message)
+
+
+class SQLiteProgressBus(ProgressBus):
+    """
+    Los mensajes se insertan en una tabla; cada worker la sondea y reenvía
+    a sus WebSocket los mensajes con id mayor al último visto.
+    Las consultas (que pueden esperar el bloqueo de escritura) corren en un hilo.
+    """
+
+    def __init__(self, db: _SQLiteDB):
+        super().__init__()
+        self._db = db
+
+    def _insert(self, payload: str) -> None:
+        self._db.connection().execute(
+            "INSERT INTO progress_events (payload, created_at) VALUES (?, ?)", (payload, time.time())
+        )
+
+    def _last_id(self) -> int:
+        return self._db.connection().execute("SELECT COALESCE(MAX(id), 0) FROM progress_events").fetchone()[0]
+
+    def _fetch(self, last_id: int):
+        return self._db.connection().execute(
+            "SELECT id, payload FROM progress_events WHERE id > ? ORDER BY id", (last_id,)
+        ).fetchall()
+
+    def _prune(self, before: float) -> None:
+        self._db.connection().execute("DELETE FROM progress_events WHERE created_at < ?", (before,))
+
+    async def publish(self, message):
+        await asyncio.to_thread(self._insert, json.dumps(message, ensure_ascii=False, default=str))
+
+    async def run(self):
+        last_id = await asyncio.to_thread(self._last_id)
+        last_prune = time.time()
+        while True:
+            try:
+                rows = await asyncio.to_thread(self._fetch, last_id)
+                for event_id, payload in rows:
+                    last_id = event_id
+                    if self._deliver is not None:
+                        await self._deliver(json.loads(payload))
+
+                now = time.time()
+                if now - last_prune > PROGRESS_RETENTION_SECONDS:
+                    await asyncio.to_thread(self._prune, now - PROGRESS_RETENTION_SECONDS)
+                    last_prune = now
+            except sqlite3.Error as e:
+                logger.warning("Error leyendo el bus de progreso: %s", e)
+            await asyncio.sleep(PROGRESS_POLL_SECONDS)
+
+
+# ============================================================
+# Contadores compartidos
+# ============================================================
+class SharedCounters(ABC):
+    """
+    Contadores enteros compartidos; `token` identifica el almacenamiento (cambia si se recrea).
+    Además de contadores sueltos admite familias con prefijo común (ej. "domain:gmail.com").
+    """
+
+    token: str
+
+    @abstractmethod
+    def get(self, name: str) -> int:
+        ...
+
+    @abstractmethod
+    def incr(self, name: str) -> int:
+        ...
+
+    @abstractmethod
+    def set(self, name: str, value: int) -> None:
+        ...
+
+    @abstractmethod
+    def compare_and_set(self, name: str, expected: int, value: int) -> bool:
+        """Asigna `value` solo si el contador vale `expected`; retorna si se asignó."""
+
+    @abstractmethod
+    def add_many(self, deltas: Mapping[str, int]) -> None:
+        """Suma varios deltas (pueden ser negativos) de forma atómica."""
+
+    @abstractmethod
+    def items(self, prefix: str) -> Dict[str, int]:
+        """Contadores cuyo nombre empieza por `prefix` (sin el prefijo)."""
+
+    @abstractmethod
+    def replace_prefix(self, prefix: str, values: Mapping[str, int], guard: Optional[Mapping[str, int]] = None) -> bool:
+        """
+        Reemplaza toda la familia `prefix` por `values` de forma atómica.
+        Con guard={nombre: valor, ...} solo se aplica si todos esos contadores
+        siguen valiendo lo indicado; retorna False si no se aplicó.
+        """
+
+
+class MemoryCounters(SharedCounters):
+    def __init__(self):
+        self.token = uuid.uuid4().hex[:8]
+        self._values: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        return self._values.get(name, 0)
+
+    def incr(self, name):
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + 1
+            return self._values[name]
+
+    def set(self, name, value):
+        with self._lock:
+            self._values[name] = value
+
+    def compare_and_set(self, name, expected, value):
+        with self._lock:
+            if self._values.get(name, 0) != expected:
+                return False
+            self._values[name] = value
+            return True
+
+    def add_many(self, deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._values[name] = self._values.get(name, 0) + delta
+
+    def items(self, prefix):
+        with self._lock:
+            return {k[len(prefix):]: v for k, v in self._values.items() if k.startswith(prefix)}
+
+    def replace_prefix(self, prefix, values, guard=None):
+        with self._lock:
+            if guard and any(self._values.get(name, 0) != value for name, value in guard.items()):
+                return False
+            for key in [k for k in self._values if k.startswith(prefix)]:
+                del self._values[key]
+            for key, value in values.items():
+                self._values[prefix + key] = value
+            return True
+
+
+class SQLiteCounters(SharedCounters):
+    def __init__(self, db: _SQLiteDB):
+        self._db = db
+        conn = db.connection()
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('token', ?)", (uuid.uuid4().hex[:8],))
+        self.token = conn.execute("SELECT value FROM meta WHERE key = 'token'").fetchone()[0]
+
+    def get(self, name):
+        row = self._db.connection().execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, name):
+        return self._db.connection().execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1 RETURNING value",
+            (name,)
+        ).fetchone()[0]
+
+    def set(self, name, value):
+        self._db.connection().execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, value)
+        )
+
+    def compare_and_set(self, name, expected, value):
+        conn = self._db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+            if (row[0] if row else 0) != expected:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                (name, value)
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add_many(self, deltas):
+        conn = self._db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                list(deltas.items())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def items(self, prefix):
+        # El rango [prefix, prefix + U+FFFF) equivale a "empieza por" y usa la clave primaria
+        rows = self._db.connection().execute(
+            "SELECT name, value FROM counters WHERE name >= ? AND name < ?",
+            (prefix, prefix + "\uffff")
+        ).fetchall()
+        return {name[len(prefix):]: value for name, value in rows}
+
+    def replace_prefix(self, prefix, values, guard=None):
+        conn = self._db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for name, value in (guard or {}).items():
+                row = conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+                if (row[0] if row else 0) != value:
+                    conn.execute("ROLLBACK")
+                    return False
+            conn.execute("DELETE FROM counters WHERE name >= ? AND name < ?", (prefix, prefix + "\uffff"))
+            conn.executemany(
+                "INSERT INTO counters (name, value) VALUES (?, ?)",
+                [(prefix + key, value) for key, value in values.items()]
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+# ============================================================
+# Registro de cambios
+# ============================================================
+Change = Tuple[int, str, Any]
+
+
+class ChangeLog(ABC):
+    """
+    Cambios numerados en orden de llegada: (id, tipo, payload JSON).
+    Quien los consume recuerda el último id aplicado y pide los siguientes.
+    Los cambios más antiguos que CHANGE_LOG_RETENTION_SECONDS se descartan.
+    """
+
+    @abstractmethod
+    def append(self, kind: str, payload: Any) -> int:
+        ...
+
+    @abstractmethod
+    def last_id(self) -> int:
+        """Id del último cambio registrado (0 si no hubo ninguno)."""
+
+    @abstractmethod
+    def read(self, after_id: int, limit: int = 1000) -> Optional[List[Change]]:
+        """
+        Cambios con id mayor a `after_id`, en orden. Retorna None si alguno de
+        ellos ya se descartó por antigüedad (el consumidor debe reconstruir).
+        """
+
+
+class MemoryChangeLog(ChangeLog):
+    def __init__(self):
+        self._changes: List[Tuple[int, str, Any, float]] = []
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def append(self, kind, payload):
+        now = time.time()
+        with self._lock:
+            self._last_id += 1
+            self._changes.append((self._last_id, kind, payload, now))
+            cutoff = now - CHANGE_LOG_RETENTION_SECONDS
+            while self._changes and self._changes[0][3] < cutoff:
+                self._changes.pop(0)
+            return self._last_id
+
+    def last_id(self):
+        return self._last_id
+
+    def read(self, after_id, limit=1000):
+        with self._lock:
+            if self._last_id > after_id and (not self._changes or self._changes[0][0] > after_id + 1):
+                return None
+            return [(i, kind, payload) for i, kind, payload, _ in self._changes if i > after_id][:limit]
+
+
+class SQLiteChangeLog(ChangeLog):
+    def __init__(self, db: _SQLiteDB):
+        self._db = db
+
+    def append(self, kind, payload):
+        now = time.time()
+        conn = self._db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            change_id = conn.execute(
+                "INSERT INTO change_log (kind, payload, created_at) VALUES (?, ?, ?)",
+                (kind, json.dumps(payload, ensure_ascii=False), now)
+            ).lastrowid
+            conn.execute("DELETE FROM change_log WHERE created_at < ?", (now - CHANGE_LOG_RETENTION_SECONDS,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return change_id
+
+    def last_id(self):
+        # sqlite_sequence conserva el último id aunque las filas ya se hayan descartado
+        row = self._db.connection().execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'change_log'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def read(self, after_id, limit=1000):
+        conn = self._db.connection()
+        conn.execute("BEGIN")
+        try:
+            first = conn.execute("SELECT MIN(id) FROM change_log").fetchone()[0]
+            if self.last_id() > after_id and (first is None or first > after_id + 1):
+                return None
+            rows = conn.execute(
+                "SELECT id, kind, payload FROM change_log WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        return [(change_id, kind, json.loads(payload)) for change_id, kind, payload in rows]
+
+
+# ============================================================
+# Selección de backend
+# ============================================================
+def _build_backends():
+    if UPLOAD_STORE_BACKEND == "memory":
+        return MemoryUploadStore(), MemoryProgressBus(), MemoryCounters(), MemoryChangeLog()
+
+    if UPLOAD_STORE_BACKEND != "sqlite":
+        logger.warning("UPLOAD_STORE=%s no reconocido; se usa sqlite", UPLOAD_STORE_BACKEND)
+    db = _SQLiteDB(_resolve_sqlite_path())
+    return SQLiteUploadStore(db), SQLiteProgressBus(db), SQLiteCounters(db), SQLiteChangeLog(db)
+
+
+upload_store, progress_bus, shared_counters, change_log = _build_backends()
@@ -0,0 +1,248 @@
+# backend/app/utils/upload_sessions.py
+
+"""
+Sesiones de carga multi-archivo.
+
+Una sesión se guarda como una entrada del caché de uploads (mismo formato que
+un upload simple, más "session": fecha de creación y archivos) y una parte por
+cada archivo agregado (upload_store.append_part). Agregar un archivo escribe
+solo sus filas, con compare-and-set sobre la versión de la sesión: nunca se
+reserializa ni se copia lo que ya estaba.
+
+Cada proceso mantiene una vista por sesión (_SessionView) que aplica solo las
+partes que aún no vio:
+
+    - Índice email -> cantidad de filas: al agregar un archivo solo se revisan
+      sus filas (duplicados dentro del archivo, contra archivos anteriores y,
+      para emails nuevos, contra la BD).
+    - Archivos recibidos, duplicados en BD y filas totales.
+
+El DataFrame completo se arma una vez por versión y solo cuando un endpoint
+lo necesita (data, statistics, export, save-to-db, ediciones). Las ediciones
+(remove-duplicates, update-cell) guardan la sesión completa con put(), que
+reemplaza la entrada y descarta las partes.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from app.utils.compact_frame import compact_frame, refresh_upload
+from app.utils.shared_state import (
+    BASE_KEY, LOCAL_ONLY_KEYS, UPLOAD_MEMO_MAX, VERSION_KEY, Part, UploadConflict, UploadStore
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SESSION_PREFIX = "session_"
+
+# Intentos de leer cabecera y partes de una misma versión base
+LOAD_ATTEMPTS = 3
+
+
+def new_session_entry() -> Dict[str, Any]:
+    import pandas as pd
+
+    return {
+        "columns": ["name", "email"],
+        "db_duplicates": [],
+        "near_duplicate_clusters": [],
+        "original_df": pd.DataFrame({"name": pd.Series(dtype=object), "email": pd.Series(dtype=object)}),
+        "email_domain": None,
+        "memory_bytes": 0,
+        "session": {"created_at": time.time(), "files": [], "file_duplicate_count": 0},
+    }
+
+
+def is_session_id(upload_id: str) -> bool:
+    return upload_id.startswith(SESSION_PREFIX)
+
+
+def _frame_bytes(df: "pd.DataFrame") -> int:
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+class _SessionView:
+    """Estado de una sesión en este proceso: la entrada base más las partes aplicadas hasta `seq`."""
+
+    def __init__(self, session_id: str, head: Dict[str, Any], base: int):
+        self.lock = threading.Lock()
+        self.session_id = session_id
+        self.head = head
+        self.base = base
+        self.version = base
+        self.seq = 0
+        df = head["original_df"]
+        self.frames = [df]
+        self.files: List[Dict[str, Any]] = list(head["session"]["files"])
+        self.db_duplicates: List[str] = list(head["db_duplicates"])
+        self.rows = len(df)
+        self.memory_bytes = head.get("memory_bytes", 0)
+        self.counts: Dict[str, int] = df["email"].value_counts().to_dict() if len(df) else {}
+        self.file_duplicate_count = sum(c for c in self.counts.values() if c > 1)
+        self._entry: Optional[Dict[str, Any]] = None
+
+    def advance(self, version: int, parts: List[Part]) -> None:
+        """Aplica las partes que aún no se vieron (costo proporcional a sus filas)."""
+        with self.lock:
+            for seq, part in parts:
+                if seq <= self.seq:
+                    continue
+                df = part["df"]
+                for email in df["email"].tolist():
+                    count = self.counts.get(email, 0)
+                    # Al pasar de 1 a 2 ocurrencias, ambas filas pasan a ser duplicadas
+                    self.file_duplicate_count += 2 if count == 1 else (1 if count > 1 else 0)
+                    self.counts[email] = count + 1
+                self.frames.append(df)
+                self.files.append(part["file"])
+                self.db_duplicates.extend(part["db_duplicates"])
+                self.rows += len(df)
+                self.memory_bytes += part["memory_bytes"]
+                self.seq = seq
+                self._entry = None
+            self.version = max(self.version, version)
+
+    def unseen_emails(self, part: "pd.DataFrame") -> Tuple[int, List[str]]:
+        """(versión, emails del archivo que la sesión aún no tiene: los únicos que hay que buscar en la BD)."""
+        with self.lock:
+            emails = [email for email in dict.fromkeys(part["email"].tolist()) if email not in self.counts]
+            return self.version, emails
+
+    def prepare(self, version: int, part: "pd.DataFrame", filename: str,
+                db_existing: List[str]) -> Tuple[Dict[str, Any], List[int]]:
+        """
+        Parte lista para append_part y posiciones (en `part`) de sus filas duplicadas.
+        No modifica la vista: se actualiza con advance() cuando la parte ya se guardó.
+        """
+        with self.lock:
+            if self.version != version:
+                raise UploadConflict(self.session_id)
+            emails = part["email"].tolist()
+            in_file: Dict[str, int] = {}
+            for email in emails:
+                in_file[email] = in_file.get(email, 0) + 1
+            duplicate_positions = [
+                i for i, email in enumerate(emails) if self.counts.get(email, 0) + in_file[email] > 1
+            ]
+            cross_file = sum(1 for email in emails if email in self.counts)
+            first_row = self.rows
+
+        df = compact_frame(part.reset_index(drop=True))
+        summary = {
+            "filename": filename,
+            "rows": len(df),
+            "first_row": first_row,
+            "file_duplicate_count": len(duplicate_positions),
+            "cross_file_duplicate_count": cross_file,
+            "db_duplicate_count": len(db_existing),
+            "added_at": time.time(),
+        }
+        stored = {"df": df, "file": summary, "db_duplicates": list(db_existing), "memory_bytes": _frame_bytes(df)}
+        return stored, duplicate_positions
+
+    def entry(self) -> Dict[str, Any]:
+        """Entrada completa (formato de upload simple) de la versión actual; se arma una vez por versión."""
+        import pandas as pd
+
+        with self.lock:
+            if self._entry is not None:
+                return self._entry
+            frames = [df for df in self.frames if len(df)] or self.frames[:1]
+            df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            # Desde aquí las partes ya aplicadas viven en un solo DataFrame
+            self.frames = [df]
+            entry = {key: value for key, value in self.head.items() if key not in LOCAL_ONLY_KEYS}
+            entry["original_df"] = df
+            entry["columns"] = df.columns.tolist()
+            entry["db_duplicates"] = list(self.db_duplicates)
+            entry["session"] = {
+                "created_at": self.head["session"]["created_at"],
+                "files": list(self.files),
+                "file_duplicate_count": self.file_duplicate_count,
+            }
+            if df is not self.head["original_df"]:
+                refresh_upload(entry)
+            entry[VERSION_KEY] = self.version
+            entry[BASE_KEY] = self.base
+            self._entry = entry
+            return entry
+
+
+_views: "OrderedDict[str, _SessionView]" = OrderedDict()
+_views_lock = threading.Lock()
+
+
+def _remember(session_id: str, view: _SessionView) -> None:
+    with _views_lock:
+        _views[session_id] = view
+        _views.move_to_end(session_id)
+        while len(_views) > UPLOAD_MEMO_MAX:
+            _views.popitem(last=False)
+
+
+def forget(session_id: str) -> None:
+    """Descarta la vista local (tras guardar o intentar guardar la sesión completa)."""
+    with _views_lock:
+        _views.pop(session_id, None)
+
+
+def load(store: UploadStore, session_id: str) -> Optional[_SessionView]:
+    """
+    Vista actualizada de la sesión, o None si no existe. Solo se leen las partes
+    nuevas; la entrada base se vuelve a leer únicamente si otra petición guardó
+    la sesión completa.
+    """
+    with _views_lock:
+        view = _views.get(session_id)
+    for _ in range(LOAD_ATTEMPTS):
+        read = store.read_parts(session_id, view.seq if view is not None else 0)
+        if read is None:
+            forget(session_id)
+            return None
+        version, base, parts = read
+        if view is None or view.base != base:
+            if view is not None and view.seq:
+                # Las partes se pidieron a partir de una base que ya no existe
+                view = None
+                continue
+            head = store.get(session_id)
+            if head is None or "session" not in head:
+                return None
+            if head.get(BASE_KEY) != base:
+                continue
+            view = _SessionView(session_id, head, base)
+        view.advance(version, parts)
+        _remember(session_id, view)
+        return view
+    raise UploadConflict(session_id)
+
+
+def add_file(store: UploadStore, session_id: str, view: _SessionView, version: int,
+             part: "pd.DataFrame", filename: str, db_existing: List[str]) -> Dict[str, Any]:
+    """
+    Agrega un archivo ya limpio a la sesión como una parte nueva. Costo
+    proporcional a sus filas. Lanza UploadConflict si la sesión cambió desde
+    `version` (la vista no se modifica hasta que la parte quedó guardada).
+    Retorna el resumen del archivo, con las posiciones (en `part`) de sus filas duplicadas.
+    """
+    stored, duplicate_positions = view.prepare(version, part, filename, db_existing)
+    new_version, seq = store.append_part(session_id, version, stored)
+    view.advance(new_version, [(seq, stored)])
+    return {**stored["file"], "duplicate_positions": duplicate_positions}
+
+
+def session_summary(session_id: str, view: _SessionView) -> Dict[str, Any]:
+    with view.lock:
+        return {
+            "session_id": session_id,
+            "files": list(view.files),
+            "file_count": len(view.files),
+            "total_rows": view.rows,
+            "file_duplicate_count": view.file_duplicate_count,
+            "db_duplicate_count": len(view.db_duplicates),
+            "can_insert": view.rows - len(view.db_duplicates),
+            "memory_bytes": view.memory_bytes,
+        }
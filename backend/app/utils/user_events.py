@@ -0,0 +1,72 @@
+# backend/app/utils/user_events.py
+
+"""
+Punto único de notificación de cambios en la tabla `users`.
+
+Todas las rutas que insertan o eliminan usuarios (crud.py, importar_excel,
+insert_users_to_db) hacen el commit y la notificación dentro de users_commit():
+
+    with users_commit():
+        db.commit()
+        users_inserted(rows)
+
+para mantener sincronizadas las estructuras derivadas (versión del listado,
+índice de n-gramas y conteos por dominio).
+
+La versión y los conteos por dominio cambian en una sola operación atómica:
+una reconciliación no puede ver la versión nueva con los conteos anteriores.
+users_commit() marca además la escritura como pendiente desde antes del commit
+hasta ese ajuste (que retira la marca en la misma operación), para que una
+reconciliación no aplique un GROUP BY que ya incluye filas cuyo delta aún no
+llegó (ver domain_stats.py).
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Counter, Dict, Iterator, List, Optional, Tuple
+
+from app.utils.domain_stats import PENDING_COUNTER, domain_stats
+from app.utils.listing_cache import bump_users_version
+from app.utils.ngram_index import users_ngram_index
+
+# Escritura en curso de este contexto: {"pending": True} hasta que se ajusta
+_current_write: ContextVar[Optional[Dict[str, bool]]] = ContextVar("users_write", default=None)
+
+
+@contextmanager
+def users_commit() -> Iterator[None]:
+    """Envuelve el commit de una escritura en `users` y su notificación."""
+    domain_stats.begin_write()
+    write = {"pending": True}
+    token = _current_write.set(write)
+    try:
+        yield
+    finally:
+        _current_write.reset(token)
+        if write["pending"]:
+            # Falló el commit o no hubo filas: no habrá ajuste que retire la marca
+            domain_stats.end_write()
+
+
+def _bump(deltas: Counter) -> None:
+    write = _current_write.get()
+    if write is not None and write["pending"]:
+        write["pending"] = False
+        deltas[PENDING_COUNTER] -= 1
+    bump_users_version(deltas)
+
+
+def users_inserted(rows: List[Tuple[int, str, str]]) -> None:
+    """rows: [(id, name, email)] de los usuarios ya confirmados en la BD."""
+    if not rows:
+        return
+    _bump(domain_stats.deltas((email for _, _, email in rows), 1))
+    users_ngram_index.add_many(rows)
+
+
+def users_deleted(rows: List[Tuple[int, str, str]]) -> None:
+    """rows: [(id, name, email)] de los usuarios ya eliminados de la BD."""
+    if not rows:
+        return
+    _bump(domain_stats.deltas((email for _, _, email in rows), -1))
+    users_ngram_index.remove_many(user_id for user_id, _, _ in rows)
@@ -0,0 +1,199 @@
+# backend/app/utils/user_export.py
+
+"""
+Exportación en streaming de la tabla `users` a CSV, XLSX o Parquet.
+
+Los escritores reciben lotes de filas (ver crud.iterar_usuarios_lotes) y
+entregan los bytes generados por cada lote en cuanto están listos, así
+el cliente recibe los primeros bytes de inmediato y la memoria usada no
+depende del tamaño de la tabla:
+
+    - csv:     csv.writer sobre un buffer que se vacía en cada lote.
+    - xlsx:    el .xlsx es un ZIP; se escribe con zipfile sobre un destino no
+               buscable (descriptores de datos) y la hoja se genera fila a fila
+               con celdas inlineStr, sin tabla de strings compartidos.
+    - parquet: pyarrow.parquet.ParquetWriter, un row group por lote. pyarrow es
+               opcional: si no está instalado el formato no se ofrece.
+"""
+
+import csv
+import importlib.util
+import io
+import re
+import zipfile
+from typing import Iterable, Iterator, List, Sequence
+from xml.sax.saxutils import escape
+
+# Se verifica sin importar: pyarrow es pesado y solo se carga al exportar Parquet
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+EXPORT_COLUMNS = ("id", "name", "email")
+
+# formato -> (media type, extensión)
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+Batches = Iterable[List[Sequence]]
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Destino de escritura que acumula bytes hasta que el generador los entrega.
+    No es buscable a propósito: zipfile escribe entonces en modo streaming.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+# ============================================================
+# CSV
+# ============================================================
+def _stream_csv(batches: Batches) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para que Excel detecte UTF-8 (nombres con tildes)
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue().encode("utf-8")
+
+    for lote in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(lote)
+        yield buffer.getvalue().encode("utf-8")
+
+
+# ============================================================
+# XLSX
+# ============================================================
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Usuarios" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+    '</Relationships>'
+)
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_END = '</sheetData></worksheet>'
+
+# Caracteres de control que XML 1.0 no admite
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xlsx_cell(value) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    text = escape(_INVALID_XML.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values: Sequence) -> str:
+    return "<row>" + "".join(_xlsx_cell(v) for v in values) + "</row>"
+
+
+def _stream_xlsx(batches: Batches) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", _WORKBOOK)
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        yield sink.drain()
+
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write((_SHEET_START + _xlsx_row(EXPORT_COLUMNS)).encode("utf-8"))
+            for lote in batches:
+                sheet.write("".join(_xlsx_row(fila) for fila in lote).encode("utf-8"))
+                yield sink.drain()
+            sheet.write(_SHEET_END.encode("utf-8"))
+    # Al cerrar el ZIP se escribe el directorio central
+    yield sink.drain()
+
+
+# ============================================================
+# Parquet
+# ============================================================
+def _stream_parquet(batches: Batches) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([("id", pa.int64()), ("name", pa.string()), ("email", pa.string())])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for lote in batches:
+            if not lote:
+                continue
+            ids, names, emails = zip(*lote)
+            writer.write_table(pa.table([list(ids), list(names), list(emails)], schema=schema))
+            yield sink.drain()
+    finally:
+        # Escribe el pie del archivo (metadatos); sin él el Parquet no es legible
+        writer.close()
+    yield sink.drain()
+
+
+_WRITERS = {
+    "csv": _stream_csv,
+    "xlsx": _stream_xlsx,
+    "parquet": _stream_parquet,
+}
+
+
+def stream_export(batches: Batches, fmt: str) -> Iterator[bytes]:
+    """Genera el archivo en el formato pedido, omitiendo fragmentos vacíos."""
+    for chunk in _WRITERS[fmt](batches):
+        if chunk:
+            yield chunk
@@ -0,0 +1,60 @@
+"""
+Archivo: warmup.py
+Ubicación: backend/app/warmup.py
+
+Descripción:
+-------------
+Calentamiento opcional en segundo plano (APP_WARMUP=1).
+
+Las dependencias pesadas (pandas, numpy, openpyxl, mysql.connector) se cargan
+de forma perezosa en el primer uso. Con el calentamiento activado, al arrancar
+se lanzan esas importaciones y se abre una conexión del pool en un hilo aparte,
+para que la primera petición real no pague ese costo. El arranque no espera
+a que termine: /ready solo depende de la conectividad con la base de datos.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict
+
+from app.database import check_connection
+from app.utils.background import spawn
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("APP_WARMUP", "0").lower() in ("1", "true", "yes")
+
+# Estado visible desde /ready
+warmup_state: Dict[str, Any] = {"status": "disabled" if not WARMUP_ENABLED else "pending", "seconds": None}
+
+
+def warm_up() -> None:
+    """Importa dependencias pesadas y abre una conexión del pool (bloqueante)."""
+    warmup_state["status"] = "running"
+    inicio = time.perf_counter()
+    try:
+        import numpy  # noqa: F401
+        import pandas  # noqa: F401
+        import openpyxl  # noqa: F401
+        import mysql.connector  # noqa: F401
+        import app.utils.data_query  # noqa: F401
+
+        ok, error = check_connection()
+        if not ok:
+            logger.warning("Calentamiento sin conexión a la BD: %s", error)
+
+        warmup_state["status"] = "done"
+    except Exception as e:
+        warmup_state["status"] = "error"
+        logger.error("Error durante el calentamiento: %s", e)
+    finally:
+        warmup_state["seconds"] = round(time.perf_counter() - inicio, 3)
+        logger.info("Calentamiento finalizado", extra={"warmup": dict(warmup_state)})
+
+
+def start_warmup() -> None:
+    """Lanza warm_up() en un hilo sin bloquear el arranque (debe llamarse con el loop activo)."""
+    if WARMUP_ENABLED:
+        spawn(asyncio.to_thread(warm_up), "warmup")
@@ -0,0 +1,366 @@
+"""
+Archivo: load_test.py
+Ubicación: backend/benchmarks/load_test.py
+
+Descripción:
+-------------
+Generador de carga concurrente (asyncio) con escenarios que imitan el uso real:
+    - dashboard:  usuarios que consultan GET /usuarios/ periódicamente (con If-None-Match,
+                  como el navegador) y de vez en cuando GET /usuarios/stats.
+    - importer:   genera un Excel en memoria, POST /api/excel/upload y luego
+                  POST /api/excel/save-to-db/{upload_id}.
+    - websocket:  suscriptores de /api/excel/ws/progress que reciben el progreso.
+    - crud:       altas y bajas individuales (POST /usuarios/ + DELETE /usuarios/{id}).
+
+Reporta por endpoint: cantidad, errores, códigos de estado, throughput y latencias
+p50/p95/p99/máx. El resumen JSON (--json) permite comparar builds con --compare.
+
+Base de datos local: el servicio `db` de docker-compose sirve como MySQL de prueba
+    docker compose up -d db
+    python benchmarks/load_test.py --spawn --duration 60
+
+Contra una app ya levantada:
+    python benchmarks/load_test.py --base-url http://localhost:8000 --dashboard-users 200 --importers 3
+
+Los usuarios creados usan el dominio @loadtest.invalid; para limpiarlos:
+    DELETE FROM users WHERE email LIKE '%@loadtest.invalid';
+
+Requiere httpx (cliente HTTP asíncrono) además de las dependencias del backend.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EMAIL_DOMAIN = "loadtest.invalid"
+
+
+# ============================================================
+# Registro de muestras
+# ============================================================
+def percentile(sorted_values, p: float):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Acumula latencias y resultados por nombre de endpoint."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.events = Counter()
+
+    def record(self, name: str, seconds: float, status, ok: bool) -> None:
+        self.latencies[name].append(seconds)
+        self.statuses[name][str(status)] += 1
+        if not ok:
+            self.errors[name] += 1
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """Eventos sin latencia (ej. mensajes recibidos por WebSocket)."""
+        self.events[name] += amount
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            ms = lambda v: round(v * 1000, 2) if v is not None else None
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": self.errors[name],
+                "status": dict(self.statuses[name]),
+                "throughput_rps": round(len(values) / elapsed, 2) if elapsed else None,
+                "p50_ms": ms(percentile(values, 50)),
+                "p95_ms": ms(percentile(values, 95)),
+                "p99_ms": ms(percentile(values, 99)),
+                "max_ms": ms(values[-1] if values else None),
+                "mean_ms": ms(sum(values) / len(values) if values else None),
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "total_requests": total,
+            "total_errors": sum(self.errors.values()),
+            "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+            "endpoints": endpoints,
+            "events": dict(self.events),
+        }
+
+
+async def timed_request(client, recorder: Recorder, name: str, method: str, url: str, ok_status=(200,), **kwargs):
+    """Ejecuta una petición y registra su latencia; retorna la respuesta o None si falló la conexión."""
+    inicio = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+    except Exception as e:
+        recorder.record(name, time.perf_counter() - inicio, type(e).__name__, False)
+        return None
+    recorder.record(name, time.perf_counter() - inicio, response.status_code, response.status_code in ok_status)
+    return response
+
+
+# ============================================================
+# Escenarios
+# ============================================================
+async def dashboard_user(client, recorder, stop, args):
+    etag = None
+    while not stop.is_set():
+        headers = {"If-None-Match": etag} if etag else {}
+        params = {"limit": args.page_size} if args.page_size else None
+        response = await timed_request(client, recorder, "GET /usuarios/", "GET", "/usuarios/",
+                                       ok_status=(200, 304), headers=headers, params=params)
+        if response is not None and response.status_code == 200:
+            etag = response.headers.get("etag")
+        if random.random() < args.stats_ratio:
+            await timed_request(client, recorder, "GET /usuarios/stats", "GET", "/usuarios/stats")
+        await _think(stop, args.think_time)
+
+
+def build_workbook(rows: int, run_id: str) -> bytes:
+    """Excel en memoria con emails únicos por corrida y algunos duplicados internos."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Usuarios")
+    sheet.append(["name", "email"])
+    for i in range(rows):
+        # ~2% de filas repiten un email anterior para ejercitar la detección de duplicados
+        n = random.randrange(i) if i and random.random() < 0.02 else i
+        sheet.append([f"Usuario {n}", f"u{n}.{run_id}@{EMAIL_DOMAIN}"])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+async def importer(client, recorder, stop, args):
+    while not stop.is_set():
+        run_id = uuid.uuid4().hex[:10]
+        contenido = await asyncio.to_thread(build_workbook, args.import_rows, run_id)
+        files = {"file": (f"carga_{run_id}.xlsx", contenido,
+                          "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
+        response = await timed_request(client, recorder, "POST /api/excel/upload", "POST",
+                                       "/api/excel/upload", files=files, params={"shape": "columns"})
+        if response is not None and response.status_code == 200:
+            upload_id = response.json()["upload_id"]
+            await timed_request(client, recorder, "POST /api/excel/save-to-db/{upload_id}", "POST",
+                                f"/api/excel/save-to-db/{upload_id}")
+        elif response is not None and response.status_code == 429:
+            # Control de admisión: se respeta Retry-After como haría el frontend
+            await _think(stop, float(response.headers.get("retry-after", "1")))
+        await _think(stop, args.import_pause)
+
+
+async def ws_subscriber(base_url, recorder, stop, args):
+    import websockets
+
+    url = base_url.replace("http://", "ws://").replace("https://", "wss://") + "/api/excel/ws/progress"
+    while not stop.is_set():
+        inicio = time.perf_counter()
+        try:
+            async with websockets.connect(url, open_timeout=args.timeout) as ws:
+                recorder.record("WS /api/excel/ws/progress (connect)", time.perf_counter() - inicio, 101, True)
+                while not stop.is_set():
+                    try:
+                        await asyncio.wait_for(ws.recv(), timeout=0.5)
+                        recorder.count("ws_messages_received")
+                    except asyncio.TimeoutError:
+                        continue
+        except Exception as e:
+            recorder.record("WS /api/excel/ws/progress (connect)", time.perf_counter() - inicio, type(e).__name__, False)
+            await _think(stop, 1.0)
+
+
+async def crud_user(client, recorder, stop, args):
+    while not stop.is_set():
+        email = f"crud.{uuid.uuid4().hex[:12]}@{EMAIL_DOMAIN}"
+        response = await timed_request(client, recorder, "POST /usuarios/", "POST", "/usuarios/",
+                                       ok_status=(201,), json={"name": "Carga CRUD", "email": email})
+        if response is not None and response.status_code == 201:
+            user_id = response.json()["id"]
+            await timed_request(client, recorder, "DELETE /usuarios/{id}", "DELETE", f"/usuarios/{user_id}")
+        await _think(stop, args.think_time)
+
+
+async def _think(stop: asyncio.Event, seconds: float) -> None:
+    """Pausa con variación aleatoria (±50%) que termina antes si la prueba se detiene."""
+    if seconds <= 0:
+        return
+    try:
+        await asyncio.wait_for(stop.wait(), timeout=seconds * random.uniform(0.5, 1.5))
+    except asyncio.TimeoutError:
+        pass
+
+
+# ============================================================
+# Ejecución
+# ============================================================
+async def run_load(args) -> dict:
+    try:
+        import httpx
+    except ImportError:
+        sys.exit("load_test.py requiere httpx: pip install httpx")
+
+    recorder = Recorder()
+    stop = asyncio.Event()
+    total_clients = args.dashboard_users + args.importers + args.crud_users
+    limits = httpx.Limits(max_connections=max(total_clients, 10), max_keepalive_connections=max(total_clients, 10))
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        plan = (
+            [lambda: dashboard_user(client, recorder, stop, args)] * args.dashboard_users
+            + [lambda: importer(client, recorder, stop, args)] * args.importers
+            + [lambda: crud_user(client, recorder, stop, args)] * args.crud_users
+            + [lambda: ws_subscriber(args.base_url, recorder, stop, args)] * args.ws_subscribers
+        )
+        random.shuffle(plan)
+
+        tasks = []
+        inicio = time.perf_counter()
+        # Arranque escalonado a lo largo de --ramp segundos
+        for i, factory in enumerate(plan):
+            tasks.append(asyncio.create_task(factory()))
+            if args.ramp > 0:
+                await asyncio.sleep(args.ramp / len(plan))
+
+        await asyncio.sleep(max(0.0, args.duration - (time.perf_counter() - inicio)))
+        stop.set()
+        await asyncio.wait(tasks, timeout=args.timeout)
+        for task in tasks:
+            task.cancel()
+        elapsed = time.perf_counter() - inicio
+
+    return recorder.summary(elapsed)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_app(workers: int):
+    """Levanta uvicorn apuntando al MySQL local (DB_HOST=127.0.0.1 salvo que se defina)."""
+    port = _free_port()
+    env = {"LOG_LEVEL": "WARNING", "DB_HOST": "127.0.0.1", **os.environ}
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers)],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env
+    )
+    return proceso, f"http://127.0.0.1:{port}"
+
+
+def wait_ready(base_url: str, timeout: float) -> None:
+    import urllib.error
+    import urllib.request
+
+    limite = time.perf_counter() + timeout
+    while time.perf_counter() < limite:
+        try:
+            with urllib.request.urlopen(base_url + "/ready", timeout=1) as respuesta:
+                if respuesta.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.2)
+    sys.exit(f"La app no respondió /ready en {timeout} s (¿está MySQL levantado?)")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(summary: dict, baseline=None) -> None:
+    header = f"{'endpoint':48} {'req':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in summary["endpoints"].items():
+        fila = (f"{name:48} {stats['requests']:>7} {stats['errors']:>5} {stats['throughput_rps']:>8} "
+                f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8} {stats['max_ms']:>8}")
+        base = (baseline or {}).get("endpoints", {}).get(name)
+        if base and base.get("p95_ms"):
+            cambio = (stats["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100
+            fila += f"   p95 {cambio:+.1f}% vs base"
+        print(fila)
+    print("-" * len(header))
+    print(f"total: {summary['total_requests']} peticiones, {summary['total_errors']} errores, "
+          f"{summary['throughput_rps']} rps en {summary['elapsed_s']} s; eventos: {summary['events']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga concurrente del backend")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--spawn", action="store_true", help="levanta uvicorn localmente contra el MySQL local")
+    parser.add_argument("--workers", type=int, default=1, help="workers de uvicorn con --spawn")
+    parser.add_argument("--duration", type=float, default=30.0, help="segundos de carga")
+    parser.add_argument("--ramp", type=float, default=5.0, help="segundos para arrancar a todos los clientes")
+    parser.add_argument("--dashboard-users", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=None, help="limit para GET /usuarios/ (por defecto todo)")
+    parser.add_argument("--stats-ratio", type=float, default=0.1, help="probabilidad de pedir /usuarios/stats por ciclo")
+    parser.add_argument("--think-time", type=float, default=2.0, help="pausa media entre acciones de un cliente")
+    parser.add_argument("--importers", type=int, default=3)
+    parser.add_argument("--import-rows", type=int, default=5000)
+    parser.add_argument("--import-pause", type=float, default=5.0)
+    parser.add_argument("--ws-subscribers", type=int, default=20)
+    parser.add_argument("--crud-users", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0, help="timeout por petición")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", dest="json_path", help="ruta donde guardar el resumen")
+    parser.add_argument("--compare", help="resumen JSON previo para comparar p95")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    proceso = None
+    if args.spawn:
+        proceso, args.base_url = spawn_app(args.workers)
+    try:
+        wait_ready(args.base_url, 60)
+        summary = asyncio.run(run_load(args))
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait(timeout=10)
+
+    resumen = {
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "config": {k: v for k, v in vars(args).items() if k not in ("json_path", "compare")},
+        **summary,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_table(resumen, baseline)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(resumen, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
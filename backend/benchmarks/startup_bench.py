@@ -0,0 +1,122 @@
+"""
+Archivo: startup_bench.py
+Ubicación: backend/benchmarks/startup_bench.py
+
+Descripción:
+-------------
+Benchmark de arranque en frío del backend. Mide, en procesos nuevos:
+    1. Tiempo de importación de `app.main` (mediana de N corridas).
+    2. Tiempo hasta que el servidor responde 200 en /ready (o /health con --probe health).
+    3. Qué dependencias pesadas quedaron cargadas tras la importación.
+
+Uso (desde backend/):
+    python benchmarks/startup_bench.py --runs 5
+    python benchmarks/startup_bench.py --probe health      # sin MySQL disponible
+    python benchmarks/startup_bench.py --json resultado.json
+
+La salida es un JSON para poder comparar builds.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl", "mysql.connector", "pymysql")
+
+IMPORT_SNIPPET = """
+import sys, time, json
+inicio = time.perf_counter()
+import app.main
+fin = time.perf_counter()
+print(json.dumps({"seconds": fin - inicio, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_import(runs: int) -> dict:
+    """Importa app.main en `runs` intérpretes nuevos y resume los tiempos."""
+    tiempos = []
+    cargados = []
+    for _ in range(runs):
+        salida = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+            env={**os.environ, "LOG_LEVEL": "WARNING"}
+        )
+        resultado = json.loads(salida.stdout.strip().splitlines()[-1])
+        tiempos.append(resultado["seconds"])
+        cargados = resultado["loaded"]
+    return {
+        "runs": runs,
+        "median_ms": round(statistics.median(tiempos) * 1000, 1),
+        "min_ms": round(min(tiempos) * 1000, 1),
+        "max_ms": round(max(tiempos) * 1000, 1),
+        "heavy_modules_loaded": cargados,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_time_to_ready(probe: str, timeout: float) -> dict:
+    """Lanza uvicorn y mide cuánto tarda el endpoint de sondeo en responder 200."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/{probe}"
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        env={**os.environ, "LOG_LEVEL": "WARNING"}
+    )
+    try:
+        while time.perf_counter() - inicio < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as respuesta:
+                    if respuesta.status == 200:
+                        return {"probe": probe, "ready": True,
+                                "ms": round((time.perf_counter() - inicio) * 1000, 1)}
+            except (urllib.error.URLError, ConnectionError, OSError):
+                pass
+            if proceso.poll() is not None:
+                break
+            time.sleep(0.05)
+        return {"probe": probe, "ready": False, "ms": None}
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque del backend")
+    parser.add_argument("--runs", type=int, default=5, help="corridas de importación")
+    parser.add_argument("--probe", choices=("ready", "health"), default="ready")
+    parser.add_argument("--timeout", type=float, default=60.0, help="segundos máximos esperando el sondeo")
+    parser.add_argument("--json", dest="json_path", help="ruta donde guardar el resumen")
+    args = parser.parse_args()
+
+    resumen = {
+        "import": measure_import(args.runs),
+        "time_to_ready": measure_time_to_ready(args.probe, args.timeout),
+        "python": sys.version.split()[0],
+    }
+
+    texto = json.dumps(resumen, indent=2)
+    print(texto)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            f.write(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# backend/tests/test_modify_upload.py
+
+"""
+Modificaciones concurrentes de un upload (excel_router._modify_upload):
+una escritura hecha entre la lectura y el guardado debe provocar un
+reintento, y un conflicto persistente un 409, en ambos almacenamientos.
+"""
+
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+from app.routers import excel_router
+from app.utils import shared_state
+from app.utils.compact_frame import refresh_upload
+
+UPLOAD_ID = "upload_test"
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, monkeypatch):
+    if request.param == "memory":
+        store = shared_state.MemoryUploadStore()
+    else:
+        store = shared_state.SQLiteUploadStore(shared_state._SQLiteDB(str(tmp_path / "upload_state.db")))
+    monkeypatch.setattr(excel_router, "uploaded_data_cache", store)
+
+    cache = {
+        "columns": ["name", "email"],
+        "db_duplicates": [],
+        "near_duplicate_clusters": [],
+        "original_df": pd.DataFrame({"name": ["a", "b"], "email": ["a@x.com", "b@x.com"]}),
+    }
+    refresh_upload(cache)
+    store[UPLOAD_ID] = cache
+    return store
+
+
+def set_name(row, value):
+    def change(cache):
+        cache["original_df"].at[row, "name"] = value
+    return change
+
+
+def test_interleaved_modification_is_retried(store):
+    attempts = []
+
+    def first(cache):
+        attempts.append(cache[shared_state.VERSION_KEY])
+        if len(attempts) == 1:
+            # Otra petición del mismo worker guarda el upload entre la lectura y el guardado
+            excel_router._modify_upload(UPLOAD_ID, set_name(1, "second"))
+        cache["original_df"].at[0, "name"] = "first"
+
+    excel_router._modify_upload(UPLOAD_ID, first)
+
+    assert len(attempts) == 2
+    assert store[UPLOAD_ID]["original_df"]["name"].tolist() == ["first", "second"]
+
+
+def test_persistent_conflict_returns_409(store):
+    def always_stale(cache):
+        excel_router._modify_upload(UPLOAD_ID, set_name(1, "other"))
+        cache["original_df"].at[0, "name"] = "lost"
+
+    with pytest.raises(HTTPException) as error:
+        excel_router._modify_upload(UPLOAD_ID, always_stale)
+
+    assert error.value.status_code == 409
+    assert store[UPLOAD_ID]["original_df"]["name"].tolist() == ["a", "other"]
@@ -13,7 +13,9 @@ USE lara_bs;
 CREATE TABLE IF NOT EXISTS users (
     id INT AUTO_INCREMENT PRIMARY KEY,
     name VARCHAR(100) NOT NULL,
-    email VARCHAR(150) UNIQUE NOT NULL
+    email VARCHAR(150) UNIQUE NOT NULL,
+    -- Índice para búsquedas por prefijo de nombre (GET /usuarios/search)
+    INDEX ix_users_name (name)
 );
 
 -- Insertar usuario si no estaba
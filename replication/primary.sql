@@ -0,0 +1,10 @@
+-- Se ejecuta solo en el primario (docker-compose.replica.yml), antes de init_db.sql.
+
+-- Usuario con el que la réplica lee el binlog
+CREATE USER IF NOT EXISTS 'repl'@'%' IDENTIFIED BY 'repl123';
+GRANT REPLICATION SLAVE ON *.* TO 'repl'@'%';
+
+-- La aplicación consulta SHOW REPLICA STATUS para medir el retraso de la réplica.
+-- El permiso se replica, así que también queda disponible en la réplica.
+GRANT REPLICATION CLIENT ON *.* TO 'daniel'@'%';
+FLUSH PRIVILEGES;
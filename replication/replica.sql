@@ -0,0 +1,13 @@
+-- Se ejecuta solo en la réplica (docker-compose.replica.yml).
+-- Con SOURCE_AUTO_POSITION la réplica pide al primario todas las transacciones GTID
+-- que le faltan, incluidas la base lara_bs, el usuario daniel y la tabla users.
+
+CHANGE REPLICATION SOURCE TO
+    SOURCE_HOST = 'db',
+    SOURCE_PORT = 3306,
+    SOURCE_USER = 'repl',
+    SOURCE_PASSWORD = 'repl123',
+    SOURCE_AUTO_POSITION = 1,
+    GET_SOURCE_PUBLIC_KEY = 1;
+
+START REPLICA;